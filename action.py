@@ -1,36 +1,56 @@
-"""Wraps an action json object"""
+"""Compact view of an action json object"""
 class Action(object):
+    """Copies what ActionPrinter and the subject logic read out of the
+    json in one pass (see DATA_FIELDS) so the json itself can be dropped."""
+    __slots__ = ('_id', '_type', '_date', '_data', '_member', '_creator')
     def __init__(self, json):
-        self.json = json
+        self._id = json.get('id', None)
+        self._type = json['type']
+        self._date = json['date']
+        self._data = project(json.get('data', {}), DATA_FIELDS)
+        member = json.get('member', None)
+        self._member = member and {'fullName' : member['fullName']}
+        creator = json.get('memberCreator', None)
+        self._creator = creator and creator['fullName']
     def __getitem__(self, key):
-        return self.json[key]
+        value = None
+        if key == 'member':
+            value = self._member
+        elif key == 'data':
+            value = self._data
+        elif key in ('id', 'type', 'date'):
+            value = getattr(self, '_' + key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    def id(self):
+        return self._id
     def type(self):
-        return self.json['type']
+        return self._type
     def date(self):
-        return self.json['date']
+        return self._date
     def data(self):
-        return self.json['data']
+        return self._data
     def board_name(self):
-        return self.data()['board']['name']
+        return self._data['board']['name']
     def has_board_name(self):
-        data = self.data()
+        data = self._data
         return ('board' in data) and ('name' in data['board'])
     def has_card_name(self):
-        data = self.data()
+        data = self._data
         return ('card' in data) and ('name' in data['card'])
     def card_name(self):
-        return self.data()['card']['name']
+        return self._data['card']['name']
     def board_url(self):
-        board = self.data()['board']
-        return u'https://trello.com/board/%s' % (board['id'],)
+        board = self._data['board']
+        return BOARD_URL % (board['id'],)
     def card_url(self):
-        card = self.data()['card']
-        return u'https://trello.com/c/%s' % (card['id'],)
+        card = self._data['card']
+        return CARD_URL % (card['id'],)
     def creator_name(self):
-        member = self.json.get('memberCreator', None)
-        if member is None:
+        if self._creator is None:
             return u'<unknown>'
-        return member['fullName']
+        return self._creator
     def derive_subject(self):
         subject = u'<unknown>'
         if self.has_card_name():
@@ -40,10 +60,52 @@ class Action(object):
         return shorten_subject(subject)
 
 
+BOARD_URL           = u'https://trello.com/board/%s'
+CARD_URL            = u'https://trello.com/c/%s'
 ZULIP_SUBJECT_MAX   = 60
 
+# Action fields and member fields Action reads; Trello queries can ask for
+# just these (see lean.py)
+ACTION_FIELDS       = ('type', 'date', 'data')
+MEMBER_FIELDS       = ('fullName',)
+
+# Keys of action['data'] that are kept, and which of their keys (None: all).
+# Anything ActionPrinter reads has to be listed here.
+DATA_FIELDS = {
+    'attachment'        : ('name', 'url'),
+    'board'             : ('id', 'name', 'labelNames', 'prefs'),
+    'boardTarget'       : ('name',),
+    'card'              : ('id', 'name', 'closed', 'due'),
+    'cardSource'        : ('name',),
+    'checkItem'         : ('name', 'state'),
+    'checklist'         : ('name',),
+    'dateLastEdited'    : None,
+    'idMemberAdded'     : None,
+    'list'              : ('name',),
+    'listAfter'         : ('name',),
+    'listBefore'        : ('name',),
+    'member'            : ('name',),
+    'old'               : None,
+    'organization'      : ('name',),
+    'text'              : None,
+}
+
+def project(data, fields):
+    out = {}
+    for k, v in data.iteritems():
+        if k not in fields:
+            continue
+        keep = fields[k]
+        if keep is not None and type(v) == dict:
+            sub = {}
+            for f in keep:
+                if f in v:
+                    sub[f] = v[f]
+            v = sub
+        out[k] = v
+    return out
+
 def shorten_subject(s):
     if len(s) > ZULIP_SUBJECT_MAX:
         return s[:ZULIP_SUBJECT_MAX - 3] + u'...'
     return s
-
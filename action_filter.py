@@ -0,0 +1,69 @@
+"""Which Trello actions are worth fetching, parsing and rendering"""
+
+from action_printer import ActionPrinter
+
+
+# Handlers that never return a message, or only with a directory
+SILENT_TYPES        = frozenset(('moveCardToBoard', 'moveListToBoard'))
+DIRECTORY_TYPES     = frozenset(('addMemberToBoard',))
+# updateCard changes (keys of data['old']) that are rendered as nothing
+SILENT_UPDATES      = frozenset(('pos', 'idAttachmentCover'))
+
+
+def handler_types():
+    """Action types ActionPrinter has a method for"""
+    return set(name for name in dir(ActionPrinter)
+               if not name.startswith('_') and name != 'get_message'
+               and callable(getattr(ActionPrinter, name)))
+
+def rendered_types(directory=False):
+    """Action types ActionPrinter has a message for"""
+    types = handler_types() - SILENT_TYPES
+    if not directory:
+        types -= DIRECTORY_TYPES
+    return types
+
+def parse_types(s):
+    """Comma separated action types, e.g. from the command line"""
+    return [t.strip() for t in s.split(',') if t.strip()]
+
+def silent_update(a):
+    """An updateCard that only changed its position or cover"""
+    old = a.get('data', {}).get('old', None)
+    if not old:
+        return False
+    for k, v in old.iteritems():
+        if k not in SILENT_UPDATES or v is None:
+            return False
+    return True
+
+
+class ActionFilter(object):
+    """Drops raw action json that would render as nothing, before an
+    Action is made of it.
+
+    types=None keeps every type (unknown ones get a generic message);
+    otherwise only those types are kept and param() is the value for
+    Trello's action filter, so the rest are not even sent.
+    """
+    def __init__(self, types=None):
+        self.types = None
+        if types is not None:
+            self.types = frozenset(types)
+        self.dropped = 0
+    @classmethod
+    def rendered(cls, allow=(), deny=(), directory=False):
+        return cls((rendered_types(directory) | set(allow)) - set(deny))
+    def param(self):
+        if self.types is None:
+            return 'all'
+        return ','.join(sorted(self.types))
+    def wanted(self, a):
+        t = a['type']
+        if self.types is not None and t not in self.types:
+            self.dropped += 1
+            return False
+        if t == 'updateCard' and silent_update(a):
+            self.dropped += 1
+            return False
+        return True
@@ -1,4 +1,14 @@
+from action import BOARD_URL, CARD_URL
+
+
+LINK_MEMO_SIZE      = 10000
+
+
 class ActionPrinter(object):
+    """directory (see directory.py) resolves ids the actions only refer to"""
+    def __init__(self, directory=None):
+        self.links = {}
+        self.directory = directory
     #
     # Helpers
     #
@@ -9,6 +19,20 @@ class ActionPrinter(object):
             handler = self._unknown_action
         msg = handler(action)
         return msg
+    def _link(self, kind, obj, url_format):
+        # Keyed on name too, so renames are never rendered stale
+        key = (kind, obj['id'], obj['name'])
+        link = self.links.get(key, None)
+        if link is None:
+            if len(self.links) >= LINK_MEMO_SIZE:
+                self.links.clear()
+            link = u'[%s](%s)' % (obj['name'], url_format % (obj['id'],))
+            self.links[key] = link
+        return link
+    def _card_link(self, a):
+        return self._link('card', a.data()['card'], CARD_URL)
+    def _board_link(self, a):
+        return self._link('board', a.data()['board'], BOARD_URL)
     def _unknown_action(self, a):
         if a.has_card_name():
             name = a.card_name()
@@ -33,117 +57,111 @@ class ActionPrinter(object):
     def addAttachmentToCard(self, a):
         attachment = a.data()['attachment']
         url = attachment.get('url', '')
-        return u'%s added [%s](%s) attachment to card [%s](%s)' % (
+        return u'%s added [%s](%s) attachment to card %s' % (
             a.creator_name(),
             attachment['name'],
             url,
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def addChecklistToCard(self, a):
-        return u'%s added checklist **%s** to card [%s](%s)' % (
+        return u'%s added checklist **%s** to card %s' % (
             a.creator_name(),
             a.data()['checklist']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def addMemberToBoard(self, a):
-        # Contains ['data']['idMemberAdded'] if we wanted to look it up
-        return None
+        # Only ['data']['idMemberAdded'], so it takes a directory to name them
+        if self.directory is None:
+            return None
+        name = self.directory.get('member', a.data()['idMemberAdded'])
+        if name is None:
+            return None
+        return u'%s added **%s** to board %s' % (
+            a.creator_name(),
+            name,
+            self._board_link(a)
+        )
     def addMemberToCard(self, a):
-        return u'%s added **%s** to card [%s](%s)' % (
+        return u'%s added **%s** to card %s' % (
             a.creator_name(),
             a['member']['fullName'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def addToOrganizationBoard(self, a):
-        return u'%s added organization **%s** to board [%s](%s)' % (
+        return u'%s added organization **%s** to board %s' % (
             a.creator_name(),
             a.data()['organization']['name'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def copyCard(self, a):
-        return u'%s copied card **%s** to [%s](%s)' % (
+        return u'%s copied card **%s** to %s' % (
             a.creator_name(),
             a.data()['cardSource']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def createBoard(self, a):
-        return u'%s created board [%s](%s)' % (
+        return u'%s created board %s' % (
             a.creator_name(),
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def createCard(self, a):
-        return u'%s created card [%s](%s)' % (
+        return u'%s created card %s' % (
             a.creator_name(),
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def createList(self, a):
-        return u'%s created list **%s** on board [%s](%s)' % (
+        return u'%s created list **%s** on board %s' % (
             a.creator_name(),
             a.data()['list']['name'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def commentCard(self, a):
         state = 'commented'
         if a.data().get('dateLastEdited', None) is not None:
             state = 'edited comment'
-        return u'%s %s on card [%s](%s) \n>%s' % (
+        return u'%s %s on card %s \n>%s' % (
             a.creator_name(),
             state,
-            a.card_name(),
-            a.card_url(),
+            self._card_link(a),
             a.data()['text'].replace('\n', '\n>')
         )
     def convertToCardFromCheckItem(self, a):
-        return u'%s converted checklist item from **%s** to card [%s](%s)' % (
+        return u'%s converted checklist item from **%s** to card %s' % (
             a.creator_name(),
             a.data()['cardSource']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def deleteAttachmentFromCard(self, a):
-        return u'%s deleted attachment **%s** from card [%s](%s)' % (
+        return u'%s deleted attachment **%s** from card %s' % (
             a.creator_name(),
             a.data()['attachment']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def deleteCard(self, a):
-        return u'%s deleted card from list **%s** on board [%s](%s)' % (
+        return u'%s deleted card from list **%s** on board %s' % (
             a.creator_name(),
             a.data()['list']['name'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def makeAdminOfBoard(self, a):
-        return u'%s made **%s** an admin of board [%s](%s)' % (
+        return u'%s made **%s** an admin of board %s' % (
             a.creator_name(),
             a['member']['fullName'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def makeNormalMemberOfBoard(self, a):
-        return u'%s made **%s** a member of board [%s](%s)' % (
+        return u'%s made **%s** a member of board %s' % (
             a.creator_name(),
             a['member']['fullName'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def moveCardToBoard(self, a):
         # Handled in paired action moveCardFromBoard
         return None
     def moveCardFromBoard(self, a):
-        return u'%s moved card [%s](%s) from **%s** to **%s**' % (
+        return u'%s moved card %s from **%s** to **%s**' % (
             a.creator_name(),
-            a.card_name(),
-            a.card_url(),
+            self._card_link(a),
             a.board_name(),
             a.data()['boardTarget']['name']
         )
@@ -158,25 +176,22 @@ class ActionPrinter(object):
             a.data()['boardTarget']['name']
         )
     def removeChecklistFromCard(self, a):
-        return u'%s removed checklist **%s** from card [%s](%s)' % (
+        return u'%s removed checklist **%s** from card %s' % (
             a.creator_name(),
             a.data()['checklist']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def removeMemberFromCard(self, a):
-        return u'%s removed **%s** from card [%s](%s)' % (
+        return u'%s removed **%s** from card %s' % (
             a.creator_name(),
             a['member']['fullName'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def unconfirmedBoardInvitation(self, a):
-        return u'%s invited (unconfirmed) **%s** to board [%s](%s)' % (
+        return u'%s invited (unconfirmed) **%s** to board %s' % (
             a.creator_name(),
             a.data()['member']['name'],
-            a.board_name(),
-            a.board_url()
+            self._board_link(a)
         )
     def updateBoard(self, a):
         # Many possibilities, signified through contents of a.data()['old']
@@ -195,11 +210,10 @@ class ActionPrinter(object):
             for k,v in new_names.iteritems():
                 label_desc.append('%s to **%s**' % (k, v))
             label_desc = ', '.join(label_desc)
-            return u'%s changed label %s on board [%s](%s)' % (
+            return u'%s changed label %s on board %s' % (
                 a.creator_name(),
                 label_desc,
-                a.board_name(),
-                a.board_url()
+                self._board_link(a)
             )
         prefs = old.get('prefs', None)
         if prefs is not None:
@@ -211,12 +225,11 @@ class ActionPrinter(object):
             elif prefs.get('selfJoin', None) is not None:
                 pref_name = 'selfJoin'
             if pref_name is not None:
-                return u'%s set **%s** preference to **%s** on board [%s](%s)' % (
+                return u'%s set **%s** preference to **%s** on board %s' % (
                     a.creator_name(),
                     pref_name,
                     a.data()['board']['prefs'][pref_name],
-                    a.board_name(),
-                    a.board_url()
+                    self._board_link(a)
                 )
         return self._unknown_action(a)
     def updateCard(self, a):
@@ -224,37 +237,33 @@ class ActionPrinter(object):
         old = a.data()['old']
         id_list = old.get('idList', None)
         if id_list is not None:
-            return u'%s moved card [%s](%s) from **%s** to **%s**' % (
+            return u'%s moved card %s from **%s** to **%s**' % (
                 a.creator_name(),
-                a.card_name(),
-                a.card_url(),
+                self._card_link(a),
                 a.data()['listBefore']['name'],
                 a.data()['listAfter']['name']
             )
         closed = old.get('closed', None)
         if closed is not None:
             new_state = a.data()['card']['closed'] and 'archived' or 're-opened'
-            return u'%s %s card [%s](%s)' % (
+            return u'%s %s card %s' % (
                 a.creator_name(),
                 new_state,
-                a.card_name(),
-                a.card_url()
+                self._card_link(a)
             )
         name = old.get('name', None)
         if name is not None:
-            return u'%s renamed card from **%s** to [%s](%s)' % (
+            return u'%s renamed card from **%s** to %s' % (
                 a.creator_name(),
                 name,
-                a.card_name(),
-                a.card_url()
+                self._card_link(a)
             )
         desc = old.get('desc', None)
         if desc is not None:
             # Note: new description is not included
-            return u'%s updated description for card [%s](%s)' % (
+            return u'%s updated description for card %s' % (
                 a.creator_name(),
-                a.card_name(),
-                a.card_url()
+                self._card_link(a)
             )
         due = old.get('due', False)
         if due is not False:
@@ -262,11 +271,10 @@ class ActionPrinter(object):
             state = 'added due date **%s** to' % (new_due,)
             if new_due is None:
                 state = 'removed due date from'
-            return u'%s %s card [%s](%s)' % (
+            return u'%s %s card %s' % (
                 a.creator_name(),
                 state,
-                a.card_name(),
-                a.card_url()
+                self._card_link(a)
             )
         if old.get('pos', None) is not None:
             # Always accompanies a list move, so just ignore
@@ -279,12 +287,11 @@ class ActionPrinter(object):
         checked_state = 'checked'
         if a.data()['checkItem']['state'] == 'incomplete':
             checked_state = 'unchecked'
-        return u'%s %s **%s** on card [%s](%s)' % (
+        return u'%s %s **%s** on card %s' % (
             a.creator_name(),
             checked_state,
             a.data()['checkItem']['name'],
-            a.card_name(),
-            a.card_url()
+            self._card_link(a)
         )
     def updateChecklist(self, a):
         old = a.data()['old']
@@ -292,7 +299,7 @@ class ActionPrinter(object):
         if name is not None:
             card_desc = ''
             if a.has_card_name():
-                card_desc = ' on card [%s](%s)' % (a.card_name(), a.card_url())
+                card_desc = ' on card %s' % (self._card_link(a),)
             return u'%s renamed checklist from **%s** to **%s**%s' % (
                 a.creator_name(),
                 name,
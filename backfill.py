@@ -0,0 +1,110 @@
+"""Resumable, paginated backfill of every board's full action history"""
+
+import json
+import os
+import shutil
+import threading
+
+from checkpoint import Checkpoint
+from scheduler import PollError
+
+
+PAGE_SIZE           = 1000
+
+
+class Backfill(object):
+    """Pages backward through each board into a spool directory, then
+    replays the spool oldest first.
+
+    Trello only pages newest to oldest (`before`), so each page is written
+    to disk as it arrives and the per-board progress is saved after every
+    page. A crash while fetching picks up at the next page; a crash while
+    posting replays the spool, skipping actions older than the `posted`
+    date saved with mark_posted() (None: the replay never got that far).
+    Memory is bounded by one page per board.
+    """
+    def __init__(self, fetcher, spool_dir, page_size=PAGE_SIZE, fsync=False):
+        self.fetcher = fetcher
+        self.spool_dir = spool_dir
+        self.page_size = page_size
+        self.state = Checkpoint(os.path.join(spool_dir, 'state.json'), fsync=fsync)
+        self.boards = {}
+        self.posted = None
+        self._lock = threading.Lock()
+    def load(self):
+        """True when resuming an earlier, unfinished backfill"""
+        if not os.path.isdir(self.spool_dir):
+            os.makedirs(self.spool_dir)
+        text = self.state.load(None)
+        if text is None:
+            return False
+        state = json.loads(text)
+        if 'boards' not in state:
+            # Written before the posted date was kept: replay it all
+            state = {'boards' : state, 'posted' : None}
+        self.boards = state['boards']
+        self.posted = state['posted']
+        return True
+    def _save(self):
+        with self._lock:
+            state = {'boards' : self.boards, 'posted' : self.posted}
+            self.state.advance(json.dumps(state, sort_keys=True))
+            self.state.flush()
+    def _page_path(self, board_id, n):
+        return os.path.join(self.spool_dir, '%s.%d.json' % (board_id, n))
+    def _fetch_board(self, board):
+        state = self.boards[board['id']]
+        while not state['done']:
+            page = self.fetcher.board_actions(board['id'], before=state['before'], limit=self.page_size)
+            if page:
+                with open(self._page_path(board['id'], state['pages']), 'w') as f:
+                    json.dump(page, f)
+                if state['newest'] is None:
+                    state['newest'] = page[0]['date']
+                state['pages'] += 1
+                # Newest first, so the last id is the oldest action
+                state['before'] = page[-1]['id']
+            state['done'] = len(page) < self.page_size
+            self._save()
+    def fetch(self, boards):
+        """Spool every board's history; raises PollError, keeping the
+        pages fetched so far, if any board fails"""
+        for b in boards:
+            if b['id'] not in self.boards:
+                self.boards[b['id']] = {
+                    'name' : b['name'],
+                    'before' : None,
+                    'pages' : 0,
+                    'newest' : None,
+                    'done' : False
+                }
+        def fetch(board):
+            try:
+                self._fetch_board(board)
+            except PollError as e:
+                return e
+        errors = [e for e in self.fetcher.pool.map(fetch, boards) if e is not None]
+        if errors:
+            raise errors[0]
+    def _replay(self, board_id, skip_before):
+        for n in reversed(range(self.boards[board_id]['pages'])):
+            with open(self._page_path(board_id, n)) as f:
+                page = json.load(f)
+            for a in reversed(page):
+                if skip_before is None or a['date'] >= skip_before:
+                    yield a
+    def replay(self, skip_before=None):
+        """Board dicts whose 'actions' are lazy, oldest-first iterators"""
+        return [
+            {'id' : board_id, 'name' : state['name'], 'actions' : self._replay(board_id, skip_before)}
+            for board_id, state in sorted(self.boards.iteritems())
+        ]
+    def mark_posted(self, date):
+        """Everything replayed up to date is posted (or in the outbox)"""
+        self.posted = date
+        self._save()
+    def newest(self):
+        """{board_id: newest action date} for boards with any actions"""
+        return dict((k, v['newest']) for k, v in self.boards.iteritems() if v['newest'] is not None)
+    def finish(self):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""Memory held by 10k actions as raw json dicts vs compact Actions"""
+
+import glob
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(BENCH_DIR, '..'))
+
+from action import Action
+
+
+COUNT = 10000
+
+def deep_size(obj, seen=None):
+    """Bytes reachable from obj, counting shared objects once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if type(obj) == dict:
+        for k, v in obj.iteritems():
+            size += deep_size(k, seen) + deep_size(v, seen)
+    elif type(obj) in (list, tuple):
+        for v in obj:
+            size += deep_size(v, seen)
+    elif hasattr(obj, '__slots__'):
+        for name in obj.__slots__:
+            size += deep_size(getattr(obj, name, None), seen)
+    return size
+
+
+texts = []
+for action_file in sorted(glob.glob(os.path.join(BENCH_DIR, '..', 'test', 'actions', '*.json'))):
+    with open(action_file) as f:
+        texts.append(f.read())
+
+# Decode each one separately so nothing is shared between actions
+raw = [json.loads(texts[i % len(texts)]) for i in xrange(COUNT)]
+
+start = time.time()
+compact = [Action(a) for a in raw]
+elapsed = time.time() - start
+
+raw_size = deep_size(raw)
+compact_size = deep_size(compact)
+print '%-24s %12s %12s' % ('', 'bytes', 'per action')
+print '%-24s %12d %12d' % ('raw json dicts', raw_size, raw_size / COUNT)
+print '%-24s %12d %12d' % ('Action', compact_size, compact_size / COUNT)
+print '%-24s %11.0f%%' % ('saved', 100.0 * (raw_size - compact_size) / raw_size)
+print '%-24s %11.2fus' % ('construction', elapsed / COUNT * 1e6)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""Compare the old concatenate + cmp sort ordering with merge_actions"""
+
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(BENCH_DIR, '..'))
+
+from merge import merge_actions, ordered
+
+
+def make_boards(num_boards, per_board):
+    start = datetime(2014, 1, 1)
+    boards = []
+    for b in range(num_boards):
+        offsets = sorted(random.randint(0, 86400 * 30) for i in range(per_board))
+        actions = [{'date' : (start + timedelta(seconds=o)).isoformat() + '.000Z', 'board' : b} for o in offsets]
+        # Trello sends newest first
+        actions.reverse()
+        boards.append(actions)
+    return boards
+
+def cmp_sort(boards):
+    actions = []
+    for b in boards:
+        actions += b
+    actions.sort(lambda x,y: cmp(x['date'], y['date']))
+    return actions
+
+def heap_merge(boards):
+    return list(merge_actions([ordered(b) for b in boards]))
+
+def first_merged(boards):
+    return next(merge_actions([ordered(b) for b in boards]))
+
+def best_of(func, boards, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(boards)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+random.seed(1)
+print '%8s %10s %10s %10s %8s %12s' % ('boards', 'actions', 'cmp sort', 'merge', 'speedup', 'first (ms)')
+for num_boards in (10, 50, 100, 200):
+    boards = make_boards(num_boards, 1000)
+    assert cmp_sort(boards) == heap_merge(boards)
+    sort_time = best_of(cmp_sort, boards)
+    merge_time = best_of(heap_merge, boards)
+    first_time = best_of(first_merged, boards)
+    print '%8d %10d %9.3fs %9.3fs %7.1fx %12.2f' % (
+        num_boards,
+        num_boards * 1000,
+        sort_time,
+        merge_time,
+        sort_time / merge_time,
+        first_time * 1000
+    )
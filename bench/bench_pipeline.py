@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""Parse, order, render and (mocked) post throughput on synthetic org payloads
+
+Each size runs --repeat times, each in its own process so peak memory is
+per size, and the best time of each stage is kept. Results can be saved
+with --json and compared against an earlier run with --baseline:
+
+    bench/bench_pipeline.py --actions 10000,100000 --json before.json
+    bench/bench_pipeline.py --actions 10000,100000 --baseline before.json
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(BENCH_DIR, '..'))
+
+from action import Action
+from action_printer import ActionPrinter
+from delivery import Delivery
+from digest import Digest
+from ingest import decode_chunks, file_chunks, iter_boards
+from merge import merge_actions, ordered
+from synth import write_org
+
+
+STAGES              = ('parse', 'order', 'render', 'post', 'total')
+# Stages quicker than this are compared as if they took this long, so
+# timer noise on tiny stages is not reported as a regression
+NOISE_FLOOR         = 0.1
+
+parser = ArgumentParser(description=__doc__.split('\n')[0])
+parser.add_argument('--boards',     type=int, default=10,                 help='boards in the organization (default: 10)')
+parser.add_argument('--actions',    default='10000,100000',               help='comma separated action counts (default: 10000,100000)')
+parser.add_argument('--seed',       type=int, default=1,                  help='random seed for the payload (default: 1)')
+parser.add_argument('--post-concurrency', type=int, default=4,            help='delivery lanes for the mocked post (default: 4)')
+parser.add_argument('--json',       metavar='FILE',                       help='save results to FILE')
+parser.add_argument('--baseline',   metavar='FILE',                       help='compare against results saved with --json')
+parser.add_argument('--repeat',     type=int, default=3,                  help='runs per size, keeping the best time of each stage (default: 3)')
+parser.add_argument('--tolerance',  type=float, default=0.2,              help='slowdown reported as a regression (default: 0.2)')
+parser.add_argument('--child',      action='store_true',                  help='(internal) run one size and print json')
+ARGS = parser.parse_args()
+
+
+def peak_mb():
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run_one(num_boards, num_actions, seed):
+    result = {'boards' : num_boards, 'actions' : num_actions, 'seconds' : {}, 'peak_mb' : {}}
+    def done(stage, started):
+        result['seconds'][stage] = time.time() - started
+        result['peak_mb'][stage] = peak_mb()
+
+    with tempfile.TemporaryFile() as f:
+        result['bytes'] = write_org(f, num_boards, num_actions, seed=seed)
+        f.seek(0)
+        result['peak_mb']['generate'] = peak_mb()
+        total = time.time()
+
+        started = time.time()
+        boards = list(iter_boards(decode_chunks(file_chunks(f))))
+        done('parse', started)
+
+    started = time.time()
+    merged = list(merge_actions([ordered(b['actions']) for b in boards]))
+    done('order', started)
+
+    started = time.time()
+    printer = ActionPrinter()
+    rendered = []
+    for a in merged:
+        action = Action(a)
+        msg = printer.get_message(action)
+        if msg is not None:
+            rendered.append((action.derive_subject(), action.date(), action.id(), msg))
+    del boards, merged
+    done('render', started)
+
+    started = time.time()
+    posted = [0]
+    def send(item):
+        # Stands in for the HTTP request: just build its body
+        urllib.urlencode(dict((k, v.encode('utf-8')) for k, v in item.iteritems()))
+        posted[0] += 1
+    delivery = Delivery(send, workers=ARGS.post_concurrency)
+    def emit(subject, actions, content):
+        delivery.submit(subject, {'type' : u'stream', 'to' : u'trello', 'subject' : subject, 'content' : content})
+    digest = Digest(emit)
+    for subject, date, action_id, msg in rendered:
+        digest.add(subject, date, action_id, msg)
+    digest.flush()
+    delivery.join()
+    delivery.close()
+    done('post', started)
+    done('total', total)
+    result['messages'] = posted[0]
+    return result
+
+def best_of(runs):
+    """The first run, with each stage's quickest time and smallest peak"""
+    best = runs[0]
+    for r in runs[1:]:
+        for stage, seconds in r['seconds'].iteritems():
+            best['seconds'][stage] = min(best['seconds'][stage], seconds)
+        for stage, mb in r['peak_mb'].iteritems():
+            best['peak_mb'][stage] = min(best['peak_mb'][stage], mb)
+    return best
+
+def report(results, baseline):
+    print '%8s %8s %10s' % ('boards', 'actions', 'MB'),
+    for stage in STAGES:
+        print '%16s' % (stage + ' act/s'),
+    print '%10s' % ('peak MB',)
+    regressions = []
+    for r in results:
+        print '%8d %8d %10.1f' % (r['boards'], r['actions'], r['bytes'] / 1e6),
+        for stage in STAGES:
+            print '%16.0f' % (r['actions'] / max(r['seconds'][stage], 1e-9),),
+        print '%10.1f' % (r['peak_mb']['total'],)
+        base = baseline.get((r['boards'], r['actions']), None)
+        if base is None:
+            continue
+        for stage in STAGES:
+            slower = max(r['seconds'][stage], NOISE_FLOOR) / max(base['seconds'][stage], NOISE_FLOOR) - 1
+            if slower > ARGS.tolerance:
+                regressions.append('%d actions: %s %.0f%% slower' % (r['actions'], stage, slower * 100))
+        grown = r['peak_mb']['total'] / max(base['peak_mb']['total'], 1e-9) - 1
+        if grown > ARGS.tolerance:
+            regressions.append('%d actions: peak memory %.0f%% higher' % (r['actions'], grown * 100))
+    return regressions
+
+
+if ARGS.child:
+    print json.dumps(run_one(ARGS.boards, int(ARGS.actions), ARGS.seed))
+    sys.exit(0)
+
+results = []
+for count in ARGS.actions.split(','):
+    runs = []
+    for i in range(max(ARGS.repeat, 1)):
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child',
+                                       '--boards', str(ARGS.boards), '--actions', count,
+                                       '--seed', str(ARGS.seed),
+                                       '--post-concurrency', str(ARGS.post_concurrency)])
+        runs.append(json.loads(out))
+    results.append(best_of(runs))
+
+baseline = {}
+if ARGS.baseline:
+    with open(ARGS.baseline) as f:
+        for r in json.load(f):
+            baseline[(r['boards'], r['actions'])] = r
+regressions = report(results, baseline)
+if ARGS.json:
+    with open(ARGS.json, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+for line in regressions:
+    print 'REGRESSION', line
+if regressions:
+    sys.exit(1)
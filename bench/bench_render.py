@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Per-action render cost of ActionPrinter over the test/actions corpus"""
+
+import glob
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(BENCH_DIR, '..'))
+
+from action import Action
+from action_printer import ActionPrinter
+
+
+REPEAT = 20000
+
+def per_action(func, actions, repeat=REPEAT):
+    best = None
+    for i in range(3):
+        start = time.time()
+        for n in xrange(repeat):
+            for a in actions:
+                func(a)
+        elapsed = (time.time() - start) / (repeat * len(actions))
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def unmemoized(printer):
+    # How links were rendered before the link memo
+    def get_message(a):
+        printer.links.clear()
+        return printer.get_message(a)
+    return get_message
+
+
+by_name = {}
+for action_file in sorted(glob.glob(os.path.join(BENCH_DIR, '..', 'test', 'actions', '*.json'))):
+    with open(action_file) as f:
+        by_name[os.path.basename(action_file)[:-5]] = Action(json.load(f))
+
+printer = ActionPrinter()
+print '%-36s %10s' % ('action', 'us/render')
+for name in sorted(by_name):
+    print '%-36s %10.2f' % (name, per_action(printer.get_message, [by_name[name]]) * 1e6)
+
+actions = by_name.values()
+memo = per_action(printer.get_message, actions, REPEAT / 10)
+no_memo = per_action(unmemoized(ActionPrinter()), actions, REPEAT / 10)
+print ''
+print '%-36s %10.2f' % ('corpus, link memo', memo * 1e6)
+print '%-36s %10.2f' % ('corpus, no link memo', no_memo * 1e6)
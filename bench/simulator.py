@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+"""Local Trello and Zulip stand-in for load and latency testing
+
+Serves a synthetic organization (see synth.py) on one port and accepts
+Zulip posts on the next, with optional latency, errors and rate limits:
+
+    bench/simulator.py --boards 20 --actions 100000 --live-rate 20 \\
+        --latency 0.05 --error-rate 0.01 --zulip-limit 200 --record posts.jsonl
+
+then set TRELLO_URL to http://127.0.0.1:8800/1 and ZULIP_URL to
+http://127.0.0.1:8801/api/v1/messages. GET /stats on either port reports
+what was served and received, including the lag from each live action to
+its post.
+"""
+
+from argparse import ArgumentParser
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from bisect import bisect_right
+from datetime import datetime
+from SocketServer import ThreadingMixIn
+from itertools import islice
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(BENCH_DIR)
+
+from synth import hex_id, board_actions, load_shapes
+
+
+DEFAULT_PORT        = 8800
+ACTIONS_LIMIT       = 1000
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Window(object):
+    """At most `limit` requests per `seconds`, in fixed windows"""
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.start = time.time()
+        self.count = 0
+        self._lock = threading.Lock()
+    def take(self):
+        """(allowed, remaining, seconds until the window resets)"""
+        with self._lock:
+            now = time.time()
+            if now - self.start >= self.seconds:
+                self.start = now
+                self.count = 0
+            self.count += 1
+            reset = self.start + self.seconds - now
+            return self.count <= self.limit, max(self.limit - self.count, 0), reset
+
+
+class Feed(object):
+    """Boards with their actions, oldest first, plus live ones added over time"""
+    def __init__(self, num_boards, num_actions, seed=1):
+        self.rand = random.Random(seed)
+        self.shapes = load_shapes()
+        self.org = {'id' : hex_id(self.rand), 'name' : 'org'}
+        self.members = [{'id' : hex_id(self.rand), 'fullName' : u'Member %d' % (m,)} for m in range(20)]
+        self.boards = []
+        for b in range(num_boards):
+            board = {'id' : hex_id(self.rand), 'name' : u'Board %d' % (b,)}
+            count = num_actions / num_boards + (1 if b < num_actions % num_boards else 0)
+            actions = board_actions(self.rand, self.shapes, board, count)[::-1]
+            board['actions'] = actions
+            board['dates'] = [a['date'] for a in actions]
+            board['index'] = dict((a['id'], i) for i, a in enumerate(actions))
+            self.boards.append(board)
+        self.by_id = dict((b['id'], b) for b in self.boards)
+        self.live = {}
+        self.generated = 0
+        self._lock = threading.Lock()
+    def add_live(self):
+        """A new commentCard on a card of its own, dated now"""
+        board = self.rand.choice(self.boards)
+        name = u'Live card %d' % (self.generated,)
+        a = {
+            'id' : hex_id(self.rand),
+            'type' : 'commentCard',
+            'date' : datetime.utcnow().isoformat()[:23] + 'Z',
+            'memberCreator' : dict(self.rand.choice(self.members)),
+            'data' : {
+                'board' : {'id' : board['id'], 'name' : board['name']},
+                'card' : {'id' : hex_id(self.rand), 'name' : name},
+                'text' : u'Comment %d' % (self.generated,)
+            }
+        }
+        with self._lock:
+            board['index'][a['id']] = len(board['actions'])
+            board['actions'].append(a)
+            board['dates'].append(a['date'])
+            self.live[name] = time.time()
+            self.generated += 1
+    def actions(self, board, since=None, before=None, limit=ACTIONS_LIMIT, types=None):
+        """Newest first, like Trello"""
+        with self._lock:
+            end = len(board['actions'])
+            if before is not None:
+                end = board['index'].get(before, end)
+            start = 0
+            if since:
+                start = bisect_right(board['dates'], since, 0, end)
+            window = board['actions'][start:end]
+        newest = reversed(window)
+        if types is not None:
+            newest = (a for a in newest if a['type'] in types)
+        return list(islice(newest, limit))
+    def lag(self, subject):
+        """Seconds since the live action with this subject was added, once"""
+        with self._lock:
+            added = self.live.pop(subject, None)
+        if added is None:
+            return None
+        return time.time() - added
+
+
+class Simulator(object):
+    def __init__(self, feed, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 zulip_limit=None, zulip_window=60, trello_limit=None, trello_window=10, record=None):
+        self.feed = feed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.windows = {
+            'zulip' : zulip_limit and Window(zulip_limit, zulip_window),
+            'trello' : trello_limit and Window(trello_limit, trello_window),
+        }
+        self.record = record
+        self.counts = {'trello' : 0, 'zulip' : 0, 'errors' : 0, 'throttled' : 0, 'posted' : 0}
+        self.lags = []
+        self.first_post = None
+        self.last_post = None
+        self._lock = threading.Lock()
+        self.servers = []
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+    def fault(self, service):
+        """(status, headers) to answer with instead, or (None, headers)
+        with rate limit headers for a normal answer"""
+        delay = self.latency + self.jitter * random.random()
+        if delay > 0:
+            time.sleep(delay)
+        headers = {}
+        window = self.windows[service]
+        allowed = True
+        if window:
+            allowed, remaining, reset = window.take()
+            if service == 'zulip':
+                headers['X-RateLimit-Limit'] = str(window.limit)
+                headers['X-RateLimit-Remaining'] = str(remaining)
+                headers['X-RateLimit-Reset'] = '%.3f' % (time.time() + reset,)
+            else:
+                headers['X-Rate-Limit-Api-Token-Max'] = str(window.limit)
+                headers['X-Rate-Limit-Api-Token-Interval-Ms'] = str(int(window.seconds * 1000))
+                headers['X-Rate-Limit-Api-Token-Remaining'] = str(remaining)
+            if not allowed:
+                headers['Retry-After'] = str(max(int(reset + 0.999), 1))
+        if not allowed or random.random() < self.throttle_rate:
+            headers.setdefault('Retry-After', '1')
+            self.count('throttled')
+            return 429, headers
+        if random.random() < self.error_rate:
+            self.count('errors')
+            return 503, headers
+        return None, headers
+    def posted(self, form):
+        now = time.time()
+        subject = form.get('subject', [''])[0].decode('utf-8')
+        lag = self.feed.lag(subject)
+        with self._lock:
+            self.counts['posted'] += 1
+            self.first_post = self.first_post or now
+            self.last_post = now
+            if lag is not None:
+                self.lags.append(lag)
+            if self.record is not None:
+                self.record.write(json.dumps({
+                    'time' : now,
+                    'to' : form.get('to', [''])[0],
+                    'subject' : subject,
+                    'content' : form.get('content', [''])[0].decode('utf-8')
+                }) + '\n')
+                self.record.flush()
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+            lags = list(self.lags)
+            elapsed = (self.last_post or 0) - (self.first_post or 0)
+        stats['generated'] = self.feed.generated
+        stats['posts_per_second'] = stats['posted'] / max(elapsed, 0.001)
+        stats['lag_p50'] = _percentile(lags, 0.5)
+        stats['lag_p99'] = _percentile(lags, 0.99)
+        stats['lag_max'] = lags and max(lags) or 0.0
+        return stats
+    def start(self, host='127.0.0.1', port=DEFAULT_PORT, zulip_port=None):
+        """Trello on port and Zulip on zulip_port (default: the next one);
+        0 picks free ports. Returns (trello base url, zulip messages url)."""
+        if zulip_port is None:
+            zulip_port = port and port + 1
+        for p in (port, zulip_port):
+            server = Server((host, p), Handler)
+            server.simulator = self
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self.servers.append(server)
+        trello, zulip = [s.server_address for s in self.servers]
+        return ('http://%s:%d/1' % trello, 'http://%s:%d/api/v1/messages' % zulip)
+    def live(self, rate):
+        """Add rate live actions per second, on a thread"""
+        def run():
+            while True:
+                time.sleep(1.0 / rate)
+                self.feed.add_live()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, body, headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.iteritems():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        sim = self.server.simulator
+        url = urlparse.urlparse(self.path)
+        if url.path == '/stats':
+            return self._reply(200, json.dumps(sim.stats(), sort_keys=True))
+        sim.count('trello')
+        status, headers = sim.fault('trello')
+        if status is not None:
+            return self._reply(status, '{"error": "simulated"}', headers)
+        body = self._trello(url.path.strip('/').split('/'), dict((k, v[0]) for k, v in urlparse.parse_qs(url.query).items()))
+        if body is None:
+            return self._reply(404, '{"error": "not found"}', headers)
+        self._reply(200, json.dumps(body), headers)
+
+    def _trello(self, parts, q):
+        feed = self.server.simulator.feed
+        parts = parts[1:]
+        def types(name):
+            value = q.get(name, 'all')
+            return value != 'all' and set(value.split(',')) or None
+        if parts[:1] in (['organization'], ['organizations']) and len(parts) >= 2:
+            if parts[2:] == ['boards']:
+                return [{'id' : b['id'], 'name' : b['name']} for b in feed.boards]
+            if 'members' in q:
+                return dict(feed.org, members=feed.members, boards=[
+                    {'id' : b['id'], 'name' : b['name'], 'lists' : []} for b in feed.boards])
+            return dict(feed.org, boards=[{
+                'id' : b['id'],
+                'name' : b['name'],
+                'actions' : feed.actions(b, since=q.get('board_actions_since', None),
+                                         limit=int(q.get('board_actions_limit', ACTIONS_LIMIT)),
+                                         types=types('board_actions'))
+            } for b in feed.boards])
+        if parts[:1] == ['boards'] and len(parts) >= 2 and parts[1] in feed.by_id:
+            board = feed.by_id[parts[1]]
+            if parts[2:] == ['actions']:
+                return feed.actions(board, since=q.get('since', None), before=q.get('before', None),
+                                    limit=int(q.get('limit', ACTIONS_LIMIT)), types=types('filter'))
+            out = {'id' : board['id'], 'name' : board['name']}
+            if 'members' in q:
+                out.update(members=feed.members, lists=[])
+            return out
+        return None
+
+    def do_POST(self):
+        sim = self.server.simulator
+        length = int(self.headers.get('Content-Length', 0))
+        form = urlparse.parse_qs(self.rfile.read(length))
+        sim.count('zulip')
+        status, headers = sim.fault('zulip')
+        if status is not None:
+            return self._reply(status, '{"result": "error", "msg": "simulated"}', headers)
+        sim.posted(form)
+        self._reply(200, '{"result": "success", "id": 1}', headers)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host',         default='127.0.0.1',                  help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port',         type=int, default=DEFAULT_PORT,       help='Trello port; Zulip listens on the next one (default: %d)' % (DEFAULT_PORT,))
+    parser.add_argument('--boards',       type=int, default=10,                 help='boards in the organization (default: 10)')
+    parser.add_argument('--actions',      type=int, default=10000,              help='actions of history over all boards (default: 10000)')
+    parser.add_argument('--seed',         type=int, default=1,                  help='random seed for the feed (default: 1)')
+    parser.add_argument('--live-rate',    type=float, default=0,                help='new actions per second, dated now (default: 0)')
+    parser.add_argument('--latency',      type=float, default=0,                help='seconds added to every request (default: 0)')
+    parser.add_argument('--jitter',       type=float, default=0,                help='up to this many more seconds, at random (default: 0)')
+    parser.add_argument('--error-rate',   type=float, default=0,                help='fraction of requests answered with a 503 (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0,               help='fraction of requests answered with a 429 (default: 0)')
+    parser.add_argument('--zulip-limit',  type=int,                             help='Zulip posts allowed per --zulip-window, then 429s')
+    parser.add_argument('--zulip-window', type=float, default=60,               help='seconds (default: 60)')
+    parser.add_argument('--trello-limit', type=int,                             help='Trello requests allowed per --trello-window, then 429s')
+    parser.add_argument('--trello-window', type=float, default=10,              help='seconds (default: 10)')
+    parser.add_argument('--record',       metavar='FILE',                       help='append received posts to FILE as json lines')
+    ARGS = parser.parse_args()
+
+    record = ARGS.record and open(ARGS.record, 'a') or None
+    sim = Simulator(Feed(ARGS.boards, ARGS.actions, seed=ARGS.seed),
+                    latency=ARGS.latency, jitter=ARGS.jitter,
+                    error_rate=ARGS.error_rate, throttle_rate=ARGS.throttle_rate,
+                    zulip_limit=ARGS.zulip_limit, zulip_window=ARGS.zulip_window,
+                    trello_limit=ARGS.trello_limit, trello_window=ARGS.trello_window,
+                    record=record)
+    trello_url, zulip_url = sim.start(ARGS.host, ARGS.port)
+    print 'TRELLO_URL=%s ZULIP_URL=%s' % (trello_url, zulip_url)
+    sys.stdout.flush()
+    if ARGS.live_rate > 0:
+        sim.live(ARGS.live_rate)
+    try:
+        while True:
+            time.sleep(10)
+            print json.dumps(sim.stats(), sort_keys=True)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print ''
@@ -0,0 +1,67 @@
+"""Synthetic Trello organization payloads shaped like test/actions/*.json"""
+
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+import random
+
+
+ACTIONS_DIR         = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'actions')
+CARDS_PER_BOARD     = 200
+START               = datetime(2014, 1, 1)
+
+
+def load_shapes(actions_dir=ACTIONS_DIR):
+    shapes = []
+    for path in sorted(glob.glob(os.path.join(actions_dir, '*.json'))):
+        with open(path) as f:
+            shapes.append(json.load(f))
+    return shapes
+
+def hex_id(rand):
+    return '%024x' % (rand.getrandbits(96),)
+
+def board_actions(rand, shapes, board, count, start=START, span=86400 * 30):
+    """count actions for board, newest first like Trello sends them"""
+    cards = [{'id' : hex_id(rand), 'name' : u'Card %d on %s' % (c, board['name'])}
+             for c in range(CARDS_PER_BOARD)]
+    offsets = sorted(rand.randint(0, span) for i in xrange(count))
+    actions = []
+    for offset in reversed(offsets):
+        shape = rand.choice(shapes)
+        a = dict(shape)
+        a['id'] = hex_id(rand)
+        a['date'] = (start + timedelta(seconds=offset)).isoformat() + '.000Z'
+        data = dict(shape.get('data', {}))
+        data['board'] = dict(data.get('board', {}), id=board['id'], name=board['name'])
+        if 'card' in data:
+            card = rand.choice(cards)
+            data['card'] = dict(data['card'], id=card['id'], name=card['name'])
+        a['data'] = data
+        actions.append(a)
+    return actions
+
+def write_org(f, num_boards, num_actions, seed=1, shapes=None):
+    """Write an organization payload with num_actions spread over
+    num_boards boards to f, one board at a time; returns bytes written"""
+    rand = random.Random(seed)
+    shapes = shapes or load_shapes()
+    written = 0
+    def out(s):
+        f.write(s)
+        return len(s)
+    written += out('{"id": "%s", "boards": [' % (hex_id(rand),))
+    for b in range(num_boards):
+        board = {'id' : hex_id(rand), 'name' : u'Board %d' % (b,)}
+        count = num_actions / num_boards + (1 if b < num_actions % num_boards else 0)
+        if b:
+            written += out(', ')
+        written += out('{"id": "%s", "name": "%s", "actions": [' % (board['id'], board['name']))
+        for i, a in enumerate(board_actions(rand, shapes, board, count)):
+            if i:
+                written += out(', ')
+            written += out(json.dumps(a))
+        written += out(']}')
+    written += out(']}')
+    return written
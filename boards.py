@@ -0,0 +1,137 @@
+"""Concurrent per-board action fetching with a since-cursor per board"""
+
+from multiprocessing.pool import ThreadPool
+import json
+import time
+
+import requests
+
+from lean import Conditional, action_params
+from metrics import NullMetrics
+from scheduler import PollError, retry_after
+
+
+DEFAULT_WORKERS     = 4
+ACTIONS_LIMIT       = 1000
+
+
+class BoardFetcher(object):
+    """lean=True asks for only the action fields Action reads and makes
+    repeated action polls conditional (see lean.Conditional).
+    action_types is Trello's action filter (see action_filter.py)."""
+    def __init__(self, transport, api_url, key, token, workers=DEFAULT_WORKERS, metrics=None, lean=False,
+                 action_types='all'):
+        self.transport = transport
+        self.metrics = metrics or NullMetrics()
+        self.api_url = api_url.rstrip('/')
+        self.auth = {'key' : key, 'token' : token}
+        self.pool = ThreadPool(max(workers, 1))
+        self.conditional = lean and Conditional() or None
+        self.action_types = action_types
+    def _get(self, path, params, conditional=False):
+        url = '%s/%s' % (self.api_url, path)
+        query = dict(self.auth)
+        query.update(params)
+        conditional = conditional and self.conditional
+        headers = conditional and conditional.headers(url, query) or {}
+        started = time.time()
+        try:
+            r = self.transport.get(url, params=query, headers=headers)
+        except requests.RequestException as e:
+            raise PollError('Error making Trello request: %s' % (e,))
+        if conditional and conditional.check(url, query, r):
+            return []
+        if r.status_code != 200:
+            raise PollError('Error making Trello request: %d %s' % (r.status_code, r.text),
+                            r.status_code, retry_after(r.headers))
+        self.metrics.observe('trello_fetch_seconds', time.time() - started)
+        self.metrics.inc('trello_bytes_total', len(r.content))
+        data = r.json()
+        if self.conditional is not None:
+            size = self.conditional.count(r, len(r.content))
+            # Only an empty answer is safe to repeat before it was processed:
+            # after new actions, the next poll asks with a newer since anyway
+            if conditional and not data:
+                conditional.remember(url, query, r, size)
+        return data
+    def board(self, board_id):
+        return self._get('boards/%s' % (board_id,), {'fields' : 'name'})
+    def names(self, org=None, board=None):
+        """Members, boards and lists of an organization (or one board) in
+        a single request, for a Directory"""
+        if board is not None:
+            return self._get('boards/%s' % (board,), {
+                'fields' : 'name',
+                'members' : 'all',
+                'member_fields' : 'fullName',
+                'lists' : 'open',
+                'list_fields' : 'name'
+            })
+        return self._get('organizations/%s' % (org,), {
+            'fields' : 'none',
+            'members' : 'all',
+            'member_fields' : 'fullName',
+            'boards' : 'open',
+            'board_fields' : 'name',
+            'board_lists' : 'open'
+        })
+    def list_boards(self, org):
+        return self._get('organizations/%s/boards' % (org,), {
+            'fields' : 'name',
+            'filter' : 'open'
+        })
+    def board_actions(self, board_id, since=None, before=None, limit=ACTIONS_LIMIT, conditional=False):
+        """Newest first, as Trello sends them. A conditional request
+        that was not modified returns no actions."""
+        params = {'filter' : self.action_types, 'limit' : str(limit)}
+        if self.conditional is not None:
+            params.update(action_params())
+        if since is not None:
+            params['since'] = since
+        if before is not None:
+            params['before'] = before
+        return self._get('boards/%s/actions' % (board_id,), params, conditional)
+    def fetch_all(self, boards, since_for):
+        """Fetch every board in parallel; returns (board, actions, error)
+        tuples in board order, with exactly one of actions/error set"""
+        def fetch(board):
+            try:
+                return (board, self.board_actions(board['id'], since_for(board), conditional=True), None)
+            except PollError as e:
+                return (board, None, e)
+        return self.pool.map(fetch, boards)
+
+
+class BoardCursors(object):
+    """Per-board since dates, saved as one json object by a Checkpoint.
+
+    advance() only stages a date; commit() makes staged dates current
+    (call it once the board's actions have been posted) and rewind()
+    drops them.
+    """
+    def __init__(self, checkpoint):
+        self.checkpoint = checkpoint
+        self.dates = {}
+        self.pending = {}
+    def load(self):
+        text = self.checkpoint.load('{}')
+        try:
+            self.dates = json.loads(text)
+        except ValueError:
+            self.dates = {}
+        return self
+    def get(self, board_id, default=None):
+        return self.dates.get(board_id, default)
+    def advance(self, board_id, date):
+        if date > self.pending.get(board_id, self.dates.get(board_id, '')):
+            self.pending[board_id] = date
+    def commit(self, save=True):
+        if not self.pending:
+            return
+        self.dates.update(self.pending)
+        self.pending = {}
+        if save:
+            self.checkpoint.advance(json.dumps(self.dates, sort_keys=True))
+            self.checkpoint.flush()
+    def rewind(self):
+        self.pending = {}
@@ -0,0 +1,67 @@
+"""Coalesced, atomic saving of the resume cursor"""
+
+import os
+import time
+
+
+DEFAULT_EVERY       = 100
+DEFAULT_INTERVAL    = 10
+
+
+class Checkpoint(object):
+    """Keeps the cursor in memory and writes it out in batches.
+
+    advance() only updates memory. Callers check due() (every N advances
+    or T seconds) and call flush() once the work up to the cursor has
+    been acknowledged, so a crash resumes at most one batch back.
+    """
+    def __init__(self, path, every=DEFAULT_EVERY, interval=DEFAULT_INTERVAL, fsync=False):
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.fsync = fsync
+        self.value = None
+        self.saved = None
+        self.flushes = 0
+        self._pending = 0
+        self._flushed_at = time.time()
+    def start(self, value):
+        """Resume from value without writing it"""
+        self.value = value
+        self.saved = value
+        self._pending = 0
+        return value
+    def load(self, default=None):
+        try:
+            with open(self.path) as f:
+                return self.start(f.read())
+        except IOError:
+            return self.start(default)
+    def advance(self, value):
+        self.value = value
+        self._pending += 1
+    def due(self):
+        if self._pending == 0:
+            return False
+        if self.every and self._pending >= self.every:
+            return True
+        return (time.time() - self._flushed_at) >= self.interval
+    def flush(self):
+        if self._pending == 0 or self.value is None:
+            return
+        tmp_path = '%s.tmp' % (self.path,)
+        with open(tmp_path, 'w') as f:
+            f.write(self.value)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(tmp_path, self.path)
+        self.saved = self.value
+        self.flushes += 1
+        self._pending = 0
+        self._flushed_at = time.time()
+    def rewind(self):
+        """Drop unsaved advances, e.g. after a partially read poll"""
+        if self.saved is not None:
+            self.value = self.saved
+        self._pending = 0
@@ -0,0 +1,146 @@
+"""Bounded, concurrent delivery that keeps per-key ordering"""
+
+from collections import deque
+import heapq
+import sys
+import threading
+import traceback
+
+
+DEFAULT_QUEUE_SIZE  = 100
+# HIGH items get this many times the room of the others
+HIGH_QUEUE_FACTOR   = 4
+
+# Priority classes, most important first
+HIGH                = 0
+NORMAL              = 1
+LOW                 = 2
+PRIORITY_NAMES      = ('high', 'normal', 'low')
+
+_STOP = object()
+
+
+class _Lane(object):
+    """One worker's items, in a FIFO per key. The next item sent is the
+    head of the key with the most important item waiting, oldest first
+    within a class, so a key is promoted as a whole and stays ordered."""
+    def __init__(self, size, high_size):
+        self.size = size
+        self.high_size = high_size
+        self.keys = {}
+        self.ranks = {}
+        self.heap = []
+        self.count = 0
+        self.unfinished = 0
+        self.stopped = False
+        self.seq = 0
+        self.cond = threading.Condition()
+    def _rank(self, key):
+        items = self.keys[key]
+        rank = (min(p for p, seq, item in items), items[0][1], key)
+        if rank != self.ranks.get(key, None):
+            self.ranks[key] = rank
+            heapq.heappush(self.heap, rank)
+    def put(self, key, item, priority):
+        with self.cond:
+            # High priority items have more room, so they are not held up
+            # behind the backlog they are meant to skip, but still bounded
+            size = self.high_size if priority == HIGH else self.size
+            while self.count >= size:
+                self.cond.wait()
+            self.seq += 1
+            self.keys.setdefault(key, deque()).append((priority, self.seq, item))
+            self._rank(key)
+            self.count += 1
+            self.unfinished += 1
+            self.cond.notify_all()
+    def take(self):
+        with self.cond:
+            while True:
+                while self.heap:
+                    rank = heapq.heappop(self.heap)
+                    key = rank[2]
+                    # Entries left behind by a promotion are skipped
+                    if self.ranks.get(key, None) != rank:
+                        continue
+                    items = self.keys[key]
+                    priority, seq, item = items.popleft()
+                    if items:
+                        self._rank(key)
+                    else:
+                        del self.keys[key]
+                        del self.ranks[key]
+                    self.count -= 1
+                    self.cond.notify_all()
+                    return priority, item
+                if self.stopped:
+                    return None, _STOP
+                self.cond.wait()
+    def done(self):
+        with self.cond:
+            self.unfinished -= 1
+            self.cond.notify_all()
+    def join(self):
+        with self.cond:
+            while self.unfinished:
+                self.cond.wait()
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+
+class Delivery(object):
+    """Runs send(item) on worker threads.
+
+    Items sharing a key are always handled by the same worker, in submit
+    order, so e.g. messages for one Zulip subject stay ordered while
+    different subjects are posted in parallel. Keys with a HIGH item
+    waiting go before NORMAL, and those before LOW. submit() blocks when
+    the worker's queue is full; HIGH items have high_queue_size (by
+    default HIGH_QUEUE_FACTOR times queue_size) of room instead.
+    """
+    def __init__(self, send, workers=1, queue_size=DEFAULT_QUEUE_SIZE, high_queue_size=None):
+        self.send = send
+        self.lanes = []
+        self.threads = []
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self._lock = threading.Lock()
+        if high_queue_size is None:
+            high_queue_size = queue_size * HIGH_QUEUE_FACTOR
+        for i in range(max(workers, 1)):
+            lane = _Lane(queue_size, max(high_queue_size, queue_size))
+            t = threading.Thread(target=self._work, args=(lane,))
+            t.daemon = True
+            t.start()
+            self.lanes.append(lane)
+            self.threads.append(t)
+    def _work(self, lane):
+        while True:
+            priority, item = lane.take()
+            if item is _STOP:
+                return
+            try:
+                self.send(item)
+                with self._lock:
+                    self.sent[priority] += 1
+            except Exception:
+                sys.stderr.write(traceback.format_exc())
+            finally:
+                lane.done()
+    def _lane(self, key):
+        return self.lanes[hash(key) % len(self.lanes)]
+    def submit(self, key, item, priority=NORMAL):
+        self._lane(key).put(key, item, priority)
+    def backlog(self):
+        """Items submitted but not yet being sent"""
+        return sum(lane.count for lane in self.lanes)
+    def join(self):
+        """Wait for everything submitted so far to be sent"""
+        for lane in self.lanes:
+            lane.join()
+    def close(self):
+        for lane in self.lanes:
+            lane.stop()
+        for t in self.threads:
+            t.join()
@@ -0,0 +1,80 @@
+"""Combine bursts of messages for one Zulip subject into a single post"""
+
+from collections import OrderedDict
+from datetime import datetime
+
+
+ZULIP_MESSAGE_MAX   = 10000
+DEFAULT_MAX_COUNT   = 50
+
+
+def parse_date(date_str):
+    """Seconds since the epoch for a Trello date string"""
+    d = datetime.strptime(date_str[:19], '%Y-%m-%dT%H:%M:%S')
+    return (d - datetime(1970, 1, 1)).total_seconds()
+
+
+class _Group(object):
+    def __init__(self, date, action_id, content):
+        self.start = parse_date(date)
+        self.actions = [(action_id, date)]
+        self.parts = [content]
+        self.length = len(content)
+    def join(self):
+        out = [self.parts[0]]
+        for prev, part in zip(self.parts, self.parts[1:]):
+            # A blank line ends a quoted comment so the next entry is not swallowed
+            out.append('\n>' in prev and u'\n\n' or u'\n')
+            out.append(part)
+        return u''.join(out)
+
+
+class Digest(object):
+    """Calls emit(subject, [(action_id, date), ...], content).
+
+    Messages for a subject whose actions fall within `window` seconds of
+    the first one are joined into one post, up to `max_chars` and
+    `max_count`. Per-subject order is kept. A window of 0 emits every
+    message as-is.
+    """
+    def __init__(self, emit, window=0, max_chars=ZULIP_MESSAGE_MAX, max_count=DEFAULT_MAX_COUNT):
+        self.emit = emit
+        self.window = window
+        self.max_chars = max_chars
+        self.max_count = max_count
+        self.groups = OrderedDict()
+        self.messages = 0
+        self.posts = 0
+    def _emit(self, subject, group):
+        self.posts += 1
+        self.emit(subject, group.actions, group.join())
+    def add(self, subject, date, action_id, content):
+        self.messages += 1
+        if self.window <= 0:
+            self.posts += 1
+            self.emit(subject, [(action_id, date)], content)
+            return
+        now = parse_date(date)
+        # Groups are created in date order, so expired ones are at the front
+        while self.groups:
+            first_subject, first = next(self.groups.iteritems())
+            if now - first.start <= self.window:
+                break
+            self._emit(first_subject, self.groups.pop(first_subject))
+        group = self.groups.get(subject, None)
+        if group is not None:
+            if (now - group.start <= self.window
+                    and len(group.parts) < self.max_count
+                    and group.length + len(content) + 2 <= self.max_chars):
+                group.actions.append((action_id, date))
+                group.parts.append(content)
+                group.length += len(content) + 2
+                return
+            self._emit(subject, self.groups.pop(subject))
+        self.groups[subject] = _Group(date, action_id, content)
+    def flush(self):
+        while self.groups:
+            subject, group = self.groups.popitem(last=False)
+            self._emit(subject, group)
+    def stats_line(self):
+        return 'digest: %d messages in %d posts' % (self.messages, self.posts)
@@ -0,0 +1,129 @@
+"""Names of Trello members, boards and lists by id, kept between runs"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_TTL         = 24 * 60 * 60
+DEFAULT_SIZE        = 50000
+SAVE_INTERVAL       = 5 * 60
+
+
+class Directory(object):
+    """Size bounded (least recently stored go first) and TTL evicting map
+    of (kind, id) to name, for kind 'member', 'board' or 'list'.
+
+    Filled in bulk by warm() from one organization or board request, due()
+    once per ttl for each source, and kept fresh by learn() from the
+    actions that pass through anyway. Lookups never make a request.
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL, size=DEFAULT_SIZE, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.warmed = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._saved_at = clock()
+        self._lock = threading.Lock()
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return self
+        cutoff = self.clock() - self.ttl
+        for kind, obj_id, name, stored_at in state.get('entries', []):
+            if stored_at >= cutoff:
+                self.entries[(kind, obj_id)] = (name, stored_at)
+        self.warmed = state.get('warmed', {})
+        self._evict()
+        return self
+    def _evict(self):
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+    def get(self, kind, obj_id):
+        with self._lock:
+            entry = self.entries.get((kind, obj_id), None)
+            if entry is not None and self.clock() - entry[1] > self.ttl:
+                del self.entries[(kind, obj_id)]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+    def _put(self, kind, obj_id, name, now):
+        key = (kind, obj_id)
+        entry = self.entries.get(key, None)
+        if entry is not None and entry[0] == name and now - entry[1] < self.ttl / 2:
+            # Fresh enough; spares rewriting it for every action
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = (name, now)
+        self._dirty = True
+    def put(self, kind, obj_id, name):
+        with self._lock:
+            self._put(kind, obj_id, name, self.clock())
+            self._evict()
+    def due(self, source):
+        """Whether source (e.g. a route label) should be warmed again"""
+        with self._lock:
+            return self.clock() - self.warmed.get(source, 0) > self.ttl
+    def warm(self, source, payload):
+        """Everything named in an organization or board response"""
+        with self._lock:
+            now = self.clock()
+            for m in payload.get('members', []):
+                self._put('member', m['id'], m['fullName'], now)
+            boards = payload.get('boards', [])
+            if 'lists' in payload:
+                boards = boards + [payload]
+            for b in boards:
+                if 'name' in b:
+                    self._put('board', b['id'], b['name'], now)
+                for l in b.get('lists', []):
+                    self._put('list', l['id'], l['name'], now)
+            self._evict()
+            self.warmed[source] = now
+            self._dirty = True
+    def learn(self, a):
+        """Names in one action's json"""
+        with self._lock:
+            now = self.clock()
+            for key in ('memberCreator', 'member'):
+                m = a.get(key, None)
+                if m and 'id' in m and 'fullName' in m:
+                    self._put('member', m['id'], m['fullName'], now)
+            data = a.get('data', {})
+            board = data.get('board', None)
+            if board and 'id' in board and 'name' in board:
+                self._put('board', board['id'], board['name'], now)
+            for key in ('list', 'listAfter', 'listBefore'):
+                l = data.get(key, None)
+                if l and 'id' in l and 'name' in l:
+                    self._put('list', l['id'], l['name'], now)
+            self._evict()
+    def save(self, force=False):
+        """Write out changes, at most once per SAVE_INTERVAL unless forced"""
+        with self._lock:
+            now = self.clock()
+            if not self._dirty or (not force and now - self._saved_at < SAVE_INTERVAL):
+                return
+            entries = [[kind, obj_id, name, stored_at]
+                       for (kind, obj_id), (name, stored_at) in self.entries.iteritems()]
+            state = {'entries' : entries, 'warmed' : dict(self.warmed)}
+            self._dirty = False
+            self._saved_at = now
+        tmp_path = '%s.tmp' % (self.path,)
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp_path, self.path)
+    def stats_line(self):
+        return 'directory: %d names, %d hits, %d misses' % (len(self.entries), self.hits, self.misses)
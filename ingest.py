@@ -0,0 +1,142 @@
+"""Incremental parsing of Trello organization and action list payloads"""
+
+import codecs
+import json
+import re
+
+
+CHUNK_SIZE          = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class FormatError(ValueError):
+    pass
+
+
+def decode_chunks(byte_chunks, encoding='utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        if type(chunk) == unicode:
+            text = chunk
+        else:
+            text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode('', True)
+    if text:
+        yield text
+
+
+def file_chunks(f, chunk_size=CHUNK_SIZE):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+class JsonStream(object):
+    """Walks a JSON document from an iterator of unicode chunks.
+
+    Only the containers the caller steps into are parsed incrementally;
+    every other value is decoded whole with raw_decode once enough text
+    has been buffered.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = u''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    def _fill(self, want=1):
+        """Buffer at least `want` more characters; False at end of input"""
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        added = 0
+        while added < want:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                break
+            self.buf += chunk
+            added += len(chunk)
+        return added > 0
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+    def expect(self, chars):
+        c = self.peek()
+        if c is None or c not in chars:
+            raise ValueError('Expected %s at offset %d, found %r' % (' or '.join(chars), self.pos, c))
+        self.pos += 1
+        return c
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # Grow geometrically so large values are not re-scanned per chunk
+                if not self._fill(max(len(self.buf) - self.pos, CHUNK_SIZE)):
+                    raise
+                continue
+            # A number may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+    def items(self):
+        """Yield (key, stream) for each member of an object; the caller must
+        consume each value (e.g. with value() or elements()) before the next"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key, self
+            if self.expect(',}') == '}':
+                return
+    def elements(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def iter_boards(chunks):
+    """Yield one board dict at a time from a Trello response.
+
+    Organization payloads yield each entry of 'boards' as soon as it has
+    been read. Plain {'actions': [...]} payloads yield a single board-like
+    dict. Organization level actions are ignored when boards are present.
+    """
+    stream = JsonStream(chunks)
+    actions = None
+    saw_boards = False
+    for key, s in stream.items():
+        if key == 'boards':
+            saw_boards = True
+            for board in s.elements():
+                yield board
+        elif key == 'actions' and not saw_boards:
+            actions = s.value()
+        else:
+            s.value()
+    if not saw_boards:
+        if actions is None:
+            raise FormatError('Unknown input format')
+        yield {'actions' : actions}
@@ -0,0 +1,101 @@
+"""Smaller Trello responses: field projection and conditional requests"""
+
+from collections import OrderedDict
+import threading
+
+from action import ACTION_FIELDS, MEMBER_FIELDS
+
+
+VALIDATORS_SIZE     = 10000
+
+
+def action_params(prefix=''):
+    """Query parameters asking Trello for only the action fields Action
+    reads. prefix is e.g. 'board_actions_' for actions nested in another
+    resource."""
+    members = ','.join(MEMBER_FIELDS)
+    return {
+        prefix + 'fields' : ','.join(ACTION_FIELDS),
+        prefix + 'member' : 'true',
+        prefix + 'member_fields' : members,
+        prefix + 'memberCreator' : 'true',
+        prefix + 'memberCreator_fields' : members,
+    }
+
+def _key(url, params):
+    return (url, tuple(sorted((k, v) for k, v in params.iteritems() if k not in ('key', 'token'))))
+
+def _wire_bytes(r):
+    """Bytes read off the connection, before any gzip decoding"""
+    try:
+        return r.raw.tell()
+    except AttributeError:
+        return len(r.content)
+
+
+class Conditional(object):
+    """ETag/Last-Modified of earlier responses per request, sent back as
+    If-None-Match/If-Modified-Since, plus byte counts for reporting.
+
+    A request is only made conditional once remember() was called for
+    its response, which callers do after they have processed it, so a
+    304 never hides actions that were not handled.
+    """
+    def __init__(self, size=VALIDATORS_SIZE):
+        self.size = size
+        self.validators = OrderedDict()
+        self.wire = 0
+        self.decoded = 0
+        self.not_modified = 0
+        self.saved = 0
+        self._lock = threading.Lock()
+    def headers(self, url, params):
+        with self._lock:
+            v = self.validators.get(_key(url, params), None)
+        headers = {}
+        if v is not None:
+            etag, last_modified, size = v
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+    def remember(self, url, params, r, size):
+        etag = r.headers.get('ETag', None)
+        last_modified = r.headers.get('Last-Modified', None)
+        if not (etag or last_modified):
+            return
+        with self._lock:
+            key = _key(url, params)
+            self.validators.pop(key, None)
+            self.validators[key] = (etag, last_modified, size)
+            while len(self.validators) > self.size:
+                self.validators.popitem(last=False)
+    def check(self, url, params, r):
+        """True for a 304, counting the bytes it saved"""
+        if r.status_code != 304:
+            return False
+        with self._lock:
+            v = self.validators.get(_key(url, params), None)
+            self.not_modified += 1
+            if v is not None:
+                self.saved += v[2]
+        r.close()
+        return True
+    def count(self, r, decoded):
+        """Record a response that was read in full; returns its wire size"""
+        wire = _wire_bytes(r)
+        with self._lock:
+            self.wire += wire
+            self.decoded += decoded
+        return wire
+    def stats_line(self):
+        with self._lock:
+            compressed = self.decoded - self.wire
+            return 'trello: %d bytes received for %d decoded (%d saved by compression), %d not modified (%d bytes saved)' % (
+                self.wire,
+                self.decoded,
+                compressed,
+                self.not_modified,
+                self.saved
+            )
@@ -0,0 +1,50 @@
+"""Lazy, date ordered merge of per-board action lists"""
+
+import heapq
+
+
+def ordered(actions):
+    """Return an oldest-first iterator over one board's actions.
+
+    Trello sends newest first, so that case is just reversed; anything
+    else (e.g. hand-made input files) falls back to a sort. Iterators that
+    are not lists are assumed to be oldest first already.
+    """
+    if not isinstance(actions, list):
+        return iter(actions)
+    ascending = True
+    descending = True
+    for i in xrange(1, len(actions)):
+        d = cmp(actions[i - 1]['date'], actions[i]['date'])
+        if d > 0:
+            ascending = False
+        elif d < 0:
+            descending = False
+        if not (ascending or descending):
+            return iter(sorted(actions, key=lambda a: a['date']))
+    if ascending:
+        return iter(actions)
+    return reversed(actions)
+
+
+def merge_actions(streams):
+    """Merge oldest-first action iterables into one oldest-first generator.
+
+    Only the head of each stream is held in the heap, and ties keep the
+    order of the streams.
+    """
+    heap = []
+    for i, stream in enumerate(streams):
+        it = iter(stream)
+        for a in it:
+            heap.append((a['date'], i, a, it))
+            break
+    heapq.heapify(heap)
+    while heap:
+        date, i, a, it = heap[0]
+        yield a
+        for nxt in it:
+            heapq.heapreplace(heap, (nxt['date'], i, nxt, it))
+            break
+        else:
+            heapq.heappop(heap)
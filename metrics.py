@@ -0,0 +1,174 @@
+"""Counters and histograms for the poll, render and post stages"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from bisect import bisect_left
+import threading
+
+
+PREFIX              = 'trello_to_zulip_'
+LATENCY_BUCKETS     = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS       = (0, 1, 10, 100, 1000, 10000)
+LAG_BUCKETS         = (1, 5, 15, 60, 300, 900, 3600, 21600, 86400)
+
+# Name: (type, help, buckets)
+METRICS = {
+    'trello_fetch_seconds'      : ('histogram', 'Trello request time until the response starts', LATENCY_BUCKETS),
+    'trello_bytes_total'        : ('counter', 'Bytes of Trello response bodies', None),
+    'trello_errors_total'       : ('counter', 'Failed Trello polls', None),
+    'parse_seconds'             : ('histogram', 'Time reading and parsing one poll', LATENCY_BUCKETS),
+    'poll_actions'              : ('histogram', 'Actions read per poll', COUNT_BUCKETS),
+    'render_seconds'            : ('histogram', 'ActionPrinter time per action, by type', LATENCY_BUCKETS),
+    'zulip_post_seconds'        : ('histogram', 'Zulip post time, retries included', LATENCY_BUCKETS),
+    'zulip_posts_total'         : ('counter', 'Zulip posts accepted', None),
+    'zulip_failures_total'      : ('counter', 'Zulip post attempts that failed', None),
+    'lag_seconds'               : ('histogram', 'Time from an action to its post', LAG_BUCKETS),
+    'messages_shed_total'       : ('counter', 'Low priority messages not posted because of the backlog, by type', None),
+}
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def _labels(labels):
+    return tuple(sorted(labels.iteritems()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % (','.join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in pairs),)
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    """Thread safe counters and histograms from METRICS, by label set"""
+    enabled = True
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self.values.get(key, None)
+            if h is None:
+                h = self.values[key] = Histogram(METRICS[name][2])
+            h.observe(value)
+    def _merged(self, name):
+        """One histogram over every label set of name"""
+        merged = Histogram(METRICS[name][2])
+        for (n, labels), h in self.values.items():
+            if n == name:
+                merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+                merged.sum += h.sum
+                merged.count += h.count
+        return merged
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            items = sorted(self.values.items())
+            for name in sorted(METRICS):
+                kind, help_text, buckets = METRICS[name]
+                series = [(labels, v) for (n, labels), v in items if n == name]
+                if not series:
+                    continue
+                lines.append('# HELP %s%s %s' % (PREFIX, name, help_text))
+                lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+                for labels, v in series:
+                    if kind == 'counter':
+                        lines.append('%s%s%s %s' % (PREFIX, name, _format_labels(labels), _format_number(v)))
+                        continue
+                    total = 0
+                    for bound, n in zip(list(buckets) + [float('inf')], v.counts):
+                        total += n
+                        lines.append('%s%s_bucket%s %d' % (PREFIX, name,
+                                     _format_labels(labels, [('le', _format_number(bound))]), total))
+                    lines.append('%s%s_sum%s %s' % (PREFIX, name, _format_labels(labels), repr(v.sum)))
+                    lines.append('%s%s_count%s %d' % (PREFIX, name, _format_labels(labels), v.count))
+        return '\n'.join(lines) + '\n'
+    def stats_line(self):
+        with self._lock:
+            parts = []
+            for name, label in (('trello_fetch_seconds', 'fetch'), ('parse_seconds', 'parse'),
+                                ('render_seconds', 'render'), ('zulip_post_seconds', 'post'),
+                                ('lag_seconds', 'lag')):
+                h = self._merged(name)
+                if h.count:
+                    parts.append('%s p50<=%ss p99<=%ss' % (label, _format_number(h.quantile(0.5)),
+                                                          _format_number(h.quantile(0.99))))
+            failures = sum(v for (n, labels), v in self.values.iteritems() if n == 'zulip_failures_total')
+        parts.append('%d post failures' % (failures,))
+        return 'metrics: ' + ', '.join(parts)
+
+
+class NullMetrics(object):
+    """Stands in for Metrics when they are off"""
+    enabled = False
+    def inc(self, name, value=1, **labels):
+        pass
+    def observe(self, name, value, **labels):
+        pass
+    def render(self):
+        return ''
+    def stats_line(self):
+        return 'metrics: off'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.server.metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """Serves metrics.render() on /metrics"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, metrics):
+        HTTPServer.__init__(self, address, MetricsHandler)
+        self.metrics = metrics
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return t
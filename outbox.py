@@ -0,0 +1,99 @@
+"""Durable queue of rendered Zulip messages waiting to be posted"""
+
+import json
+import sqlite3
+import threading
+
+
+DONE_BATCH          = 50
+READ_BATCH          = 500
+
+
+class Outbox(object):
+    """SQLite table of messages that were rendered but not yet posted.
+
+    put() queues a message and done() removes it once posted. Inserts and
+    removals are committed in batches: commit() makes everything put so
+    far durable, and removals are committed every `batch` done() calls.
+    A crash therefore never loses a committed message, but can post one
+    again if it was removed after the last commit.
+
+    Rows are (row_id, key, actions, params), actions being
+    [(action_id, date), ...]. Action ids of queued rows are kept in
+    memory so callers can skip actions that are already waiting.
+    """
+    def __init__(self, path, fsync=False, batch=DONE_BATCH):
+        self.path = path
+        self.fsync = fsync
+        self.batch = batch
+        self.action_ids = {}
+        self.queued = 0
+        self.posted = 0
+        self._done = []
+        self._lock = threading.Lock()
+        self._db = None
+    def open(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=%s' % (self.fsync and 'FULL' or 'NORMAL',))
+        self._db.execute('CREATE TABLE IF NOT EXISTS outbox ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'key TEXT, actions TEXT, params TEXT)')
+        self._db.commit()
+        for row in self.pending():
+            self._remember(row)
+        return self
+    def _remember(self, row):
+        for action_id, date in row[2]:
+            self.action_ids[action_id] = row[0]
+    def _forget(self, row):
+        for action_id, date in row[2]:
+            if self.action_ids.get(action_id, None) == row[0]:
+                del self.action_ids[action_id]
+    def __contains__(self, action_id):
+        return action_id in self.action_ids
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] - len(self._done)
+    def put(self, key, actions, params):
+        with self._lock:
+            cur = self._db.execute('INSERT INTO outbox (key, actions, params) VALUES (?, ?, ?)',
+                                   (key, json.dumps(actions), json.dumps(params)))
+            row = (cur.lastrowid, key, actions, params)
+            self._remember(row)
+            self.queued += 1
+        return row
+    def done(self, row):
+        with self._lock:
+            self._forget(row)
+            self._done.append((row[0],))
+            self.posted += 1
+            if len(self._done) >= self.batch:
+                self._commit()
+    def _commit(self):
+        if self._done:
+            self._db.executemany('DELETE FROM outbox WHERE id = ?', self._done)
+            self._done = []
+        self._db.commit()
+    def commit(self):
+        with self._lock:
+            self._commit()
+    def pending(self):
+        """Queued rows, oldest first"""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute('SELECT id, key, actions, params FROM outbox '
+                                        'WHERE id > ? ORDER BY id LIMIT ?',
+                                        (last, READ_BATCH)).fetchall()
+            if not rows:
+                return
+            for row_id, key, actions, params in rows:
+                last = row_id
+                yield (row_id, key, [tuple(a) for a in json.loads(actions)], json.loads(params))
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
+    def stats_line(self):
+        return 'outbox: %d queued, %d posted, %d waiting' % (self.queued, self.posted, len(self))
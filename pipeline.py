@@ -0,0 +1,78 @@
+"""Run an iterator on a background thread behind a bounded queue"""
+
+from Queue import Empty, Full, Queue
+import sys
+import threading
+
+
+DEFAULT_DEPTH       = 16
+WAIT                = 0.1
+
+_END = object()
+
+
+class Stage(object):
+    """Iterates `source` on its own thread, handing items to the consumer
+    through a queue of `depth` items. The producer blocks when it is that
+    far ahead (backpressure), and an exception in the producer is raised
+    in the consumer after the items before it.
+
+    Stopping iteration early (or close()) stops the producer at its next
+    item. `full` and `empty` count how often the producer or the consumer
+    had to wait, which shows which side is the bottleneck.
+    """
+    def __init__(self, source, depth=DEFAULT_DEPTH):
+        self.queue = Queue(max(depth, 1))
+        self.stopped = False
+        self.error = None
+        self.full = 0
+        self.empty = 0
+        self.thread = threading.Thread(target=self._run, args=(source,))
+        self.thread.daemon = True
+        self.thread.start()
+    def _put(self, item):
+        if self.queue.full():
+            self.full += 1
+        while not self.stopped:
+            try:
+                self.queue.put(item, True, WAIT)
+                return True
+            except Full:
+                pass
+        return False
+    def _run(self, source):
+        try:
+            for item in source:
+                if not self._put(item):
+                    break
+        except Exception:
+            self.error = sys.exc_info()
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+            self._put(_END)
+    def _get(self):
+        while True:
+            try:
+                # A timeout keeps the wait interruptible
+                return self.queue.get(True, 3600)
+            except Empty:
+                pass
+    def __iter__(self):
+        try:
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    self.empty += 1
+                    item = self._get()
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self.stopped = True
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+    def close(self):
+        self.stopped = True
@@ -0,0 +1,54 @@
+"""Priority classes for actions, for delivery order and load shedding"""
+
+from delivery import HIGH, LOW, NORMAL, PRIORITY_NAMES
+
+
+# By action type; anything not listed is NORMAL
+TYPE_PRIORITY = {
+    'commentCard'                   : HIGH,
+    'convertToCardFromCheckItem'    : HIGH,
+    'copyCard'                      : HIGH,
+    'createBoard'                   : HIGH,
+    'createCard'                    : HIGH,
+    'createList'                    : HIGH,
+    'deleteCard'                    : HIGH,
+    'updateBoard'                   : LOW,
+    'updateCheckItemStateOnCard'    : LOW,
+    'updateChecklist'               : LOW,
+}
+
+# updateCard by what changed (keys of data['old']): moves, archiving and
+# renames keep the default, cosmetic edits are LOW
+UPDATE_PRIORITY = {
+    'desc'                          : LOW,
+    'due'                           : LOW,
+    'idAttachmentCover'             : LOW,
+    'pos'                           : LOW,
+}
+
+
+def parse_priorities(entries):
+    """{type: class} from 'type=high' style entries; raises ValueError"""
+    out = {}
+    for entry in entries:
+        action_type, sep, name = entry.partition('=')
+        if not sep or name not in PRIORITY_NAMES:
+            raise ValueError('expected TYPE=%s, got %r' % ('|'.join(PRIORITY_NAMES), entry))
+        out[action_type] = PRIORITY_NAMES.index(name)
+    return out
+
+
+class Priorities(object):
+    """Class of an Action; overrides ({type: class}) win over the tables"""
+    def __init__(self, overrides=None):
+        self.types = dict(TYPE_PRIORITY)
+        self.types.update(overrides or {})
+        self.overridden = set(overrides or ())
+    def of(self, action):
+        action_type = action.type()
+        if action_type == 'updateCard' and action_type not in self.overridden:
+            old = action.data().get('old', {})
+            if old and all(UPDATE_PRIORITY.get(k, NORMAL) == LOW for k in old):
+                return LOW
+            return NORMAL
+        return self.types.get(action_type, NORMAL)
@@ -0,0 +1,97 @@
+"""Token bucket rate limiting fed by upstream rate-limit headers"""
+
+import threading
+import time
+
+from scheduler import retry_after
+
+
+HEADROOM            = 0.9
+DEFAULT_PAUSE       = 1.0
+
+
+def _number(headers, *names):
+    for name in names:
+        value = headers.get(name, None)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return None
+
+
+class RateLimiter(object):
+    """Paces requests to one upstream.
+
+    Starts at `rate` requests per second (None: unlimited) and adjusts to
+    just under what the upstream reports through its headers:
+    X-RateLimit-Remaining/-Reset (Zulip), X-Rate-Limit-Api-Token-*
+    (Trello) and Retry-After. acquire() blocks until a request may go.
+    """
+    def __init__(self, rate=None, burst=1, headroom=HEADROOM, clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.headroom = headroom
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0
+        self.started = self.updated
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+    def acquire(self):
+        with self._lock:
+            now = self.clock()
+            wait = max(0, self.paused_until - now)
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Going negative reserves a slot, so concurrent callers queue up
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            self.requests += 1
+            self.waited += wait
+        if wait > 0:
+            self.sleep(wait)
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+    def learn(self, status_code, headers):
+        now = self.clock()
+        rate = None
+        pause = None
+        # Zulip: requests left until the reset timestamp
+        remaining = _number(headers, 'X-RateLimit-Remaining')
+        reset = _number(headers, 'X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            window = max(reset - now, 0.001)
+            rate = self.headroom * remaining / window
+            if remaining < 1:
+                pause = window
+        # Trello: a maximum per interval
+        limit = _number(headers, 'X-Rate-Limit-Api-Token-Max', 'X-Rate-Limit-Api-Key-Max')
+        interval = _number(headers, 'X-Rate-Limit-Api-Token-Interval-Ms', 'X-Rate-Limit-Api-Key-Interval-Ms')
+        if limit is not None and interval:
+            rate = self.headroom * limit / (interval / 1000.0)
+            remaining = _number(headers, 'X-Rate-Limit-Api-Token-Remaining', 'X-Rate-Limit-Api-Key-Remaining')
+            if remaining is not None and remaining < 1:
+                pause = interval / 1000.0
+        if status_code == 429:
+            self.throttled += 1
+            after = retry_after(headers)
+            pause = max(pause or 0, after if after is not None else DEFAULT_PAUSE)
+            if rate is None and self.rate:
+                rate = self.rate / 2.0
+        with self._lock:
+            if rate is not None:
+                self.rate = max(rate, 0.01)
+        if pause:
+            self.pause(pause)
+    def achieved(self):
+        elapsed = max(self.clock() - self.started, 0.001)
+        return self.requests / elapsed
@@ -0,0 +1,69 @@
+"""Re-render archived Trello dumps, spread over worker processes"""
+
+from multiprocessing import Pool
+import glob
+import gzip
+import os
+
+from action import Action
+from action_printer import ActionPrinter
+from ingest import decode_chunks, file_chunks, iter_boards
+from merge import merge_actions, ordered
+
+
+GZIP_MAGIC          = '\x1f\x8b'
+
+
+def dump_paths(patterns):
+    """Files named by each pattern in turn: a directory stands for every
+    file in it, anything else is a glob. Sorted within a pattern."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = [os.path.join(pattern, n) for n in os.listdir(pattern)]
+        else:
+            names = glob.glob(pattern)
+        paths += sorted(n for n in names if os.path.isfile(n))
+    return paths
+
+def open_dump(path):
+    """Plain or gzip compressed, told apart by content"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == GZIP_MAGIC:
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def render_dump(path):
+    """(path, action count, [(subject, date, action_id, message), ...])
+    for one dump, in the order it would be posted"""
+    printer = ActionPrinter()
+    rendered = []
+    count = 0
+    try:
+        with open_dump(path) as f:
+            boards = [ordered(b.get('actions', [])) for b in iter_boards(decode_chunks(file_chunks(f)))]
+    except (IOError, ValueError) as e:
+        # Raised again in the parent, so say which file
+        raise ValueError('%s: %s' % (path, e))
+    for a in merge_actions(boards):
+        count += 1
+        action = Action(a)
+        msg = printer.get_message(action)
+        if msg is not None:
+            rendered.append((action.derive_subject(), action.date(), action.id(), msg))
+    return path, count, rendered
+
+def render_dumps(paths, processes=1):
+    """render_dump() for every path, yielded in path order. With more than
+    one process, dumps are rendered in parallel, a whole dump per task."""
+    if processes <= 1:
+        for path in paths:
+            yield render_dump(path)
+        return
+    pool = Pool(processes)
+    try:
+        for result in pool.imap(render_dump, paths):
+            yield result
+    finally:
+        pool.terminate()
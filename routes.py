@@ -0,0 +1,59 @@
+"""Trello organization/board to Zulip stream routes"""
+
+
+class Route(object):
+    """One Trello source (an organization or a single board) and the
+    Zulip stream its actions go to.
+
+    Routes from a ROUTES list are named (NAME, or the org/board id), and
+    the name suffixes their state files so every route keeps its own
+    dates. The single route from TRELLO_ORG/ZULIP_STREAM is unnamed and
+    keeps the plain file names.
+    """
+    def __init__(self, stream, org=None, board=None, name=None):
+        self.stream = stream
+        self.org = org
+        self.board = board
+        self.name = name
+    def label(self):
+        if self.name is None:
+            return ''
+        return '[%s] ' % (self.name,)
+    def path(self, base):
+        if self.name is None:
+            return base
+        return '%s.%s' % (base, self.name)
+    def key(self, action_id):
+        """Id for the seen index and outbox. An action covered by routes
+        to different streams is posted to each of them."""
+        if self.name is None:
+            return action_id
+        return '%s/%s' % (self.stream, action_id)
+
+
+def parse_routes(entries):
+    """Routes from a list of {"TRELLO_ORG" or "TRELLO_BOARD", "ZULIP_STREAM",
+    "NAME" (optional)} objects; raises ValueError for a bad list"""
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('ROUTES must be a non-empty list')
+    routes = []
+    names = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError('Route must be an object: %r' % (entry,))
+        for k in ('TRELLO_ORG', 'TRELLO_BOARD', 'ZULIP_STREAM', 'NAME'):
+            if not isinstance(entry.get(k, u''), basestring):
+                raise ValueError('Route %s must be a string: %r' % (k, entry))
+        org = entry.get('TRELLO_ORG', None)
+        board = entry.get('TRELLO_BOARD', None)
+        stream = entry.get('ZULIP_STREAM', None)
+        if (org is None) == (board is None):
+            raise ValueError('Route needs one of TRELLO_ORG or TRELLO_BOARD: %r' % (entry,))
+        if stream is None:
+            raise ValueError('Route needs ZULIP_STREAM: %r' % (entry,))
+        name = entry.get('NAME', org or board)
+        if name in names or '/' in name:
+            raise ValueError('Route names must be unique file name parts: %r' % (name,))
+        names.add(name)
+        routes.append(Route(stream, org=org, board=board, name=name))
+    return routes
@@ -0,0 +1,74 @@
+"""Adaptive poll intervals with exponential backoff on errors"""
+
+import random
+
+
+BACKOFF_MAX         = 15 * 60
+
+
+class PollError(Exception):
+    """A poll that got no usable response; status_code is None when
+    there was no response at all"""
+    def __init__(self, message, status_code=None, retry_after=None):
+        Exception.__init__(self, message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def is_retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+class Scheduler(object):
+    """Chooses the sleep before the next poll.
+
+    Polls that return actions halve the interval down to `minimum`, idle
+    polls grow it by half up to `maximum`. Failed polls (no response, 429
+    or 5xx) back off exponentially from `base` up to `backoff_max`, with
+    jitter, honouring Retry-After when it asks for longer.
+    """
+    def __init__(self, base, minimum=None, maximum=None, backoff_max=BACKOFF_MAX, rand=random.random):
+        self.base = base
+        self.minimum = base if minimum is None else min(minimum, base)
+        self.maximum = base if maximum is None else max(maximum, base)
+        self.backoff_max = max(backoff_max, self.maximum)
+        self.rand = rand
+        self.interval = base
+        self.failures = 0
+        self.reason = 'start'
+    def _backoff(self, retry_after):
+        self.failures += 1
+        ceiling = min(self.backoff_max, self.base * (2 ** self.failures))
+        # Equal jitter: somewhere in the upper half of the ceiling
+        delay = ceiling / 2.0 + self.rand() * ceiling / 2.0
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+    def success(self, num_actions):
+        self.failures = 0
+        if num_actions > 0:
+            self.interval = max(self.minimum, self.interval / 2.0)
+            self.reason = 'active, %d actions' % (num_actions,)
+        else:
+            self.interval = min(self.maximum, self.interval * 1.5)
+            self.reason = 'idle'
+        return self.interval
+    def failure(self, status_code=None, retry_after=None):
+        if status_code is not None and not is_retryable(status_code):
+            # e.g. a bad token; retrying sooner or later will not help
+            self.reason = 'error %d' % (status_code,)
+            return self.interval
+        delay = self._backoff(retry_after)
+        self.reason = 'backoff #%d after %s' % (self.failures, status_code or 'no response')
+        return delay
+
+
+def retry_after(headers):
+    """Seconds from a Retry-After header, or None"""
+    value = headers.get('Retry-After', None)
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        return None
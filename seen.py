@@ -0,0 +1,82 @@
+"""Persistent index of action ids that were already delivered"""
+
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+
+DEFAULT_DAYS        = 7
+COMPACT_INTERVAL    = 3600
+
+
+class SeenIndex(object):
+    """Append-only log of '<id> <date>' lines plus an in-memory id set.
+
+    Ids are dropped once their action date is older than `days`, which
+    bounds both the set and, after compact(), the log file. flush()
+    compacts at most once per COMPACT_INTERVAL seconds.
+    """
+    def __init__(self, path, days=DEFAULT_DAYS):
+        self.path = path
+        self.days = days
+        self.ids = {}
+        self._lock = threading.Lock()
+        self._log = None
+        self._stale = 0
+        self._compacted_at = time.time()
+    def _cutoff(self):
+        return (datetime.utcnow() - timedelta(days=self.days)).isoformat() + 'Z'
+    def load(self):
+        cutoff = self._cutoff()
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        self._stale += 1
+                    elif parts[1] < cutoff:
+                        self._stale += 1
+                    else:
+                        self.ids[parts[0]] = parts[1]
+        except IOError:
+            pass
+        if self._stale > len(self.ids):
+            self.compact()
+        return self
+    def __contains__(self, action_id):
+        return action_id in self.ids
+    def __len__(self):
+        return len(self.ids)
+    def add(self, action_id, date):
+        with self._lock:
+            if action_id in self.ids:
+                return
+            self.ids[action_id] = date
+            if self._log is None:
+                self._log = open(self.path, 'a')
+            self._log.write('%s %s\n' % (action_id, date))
+    def flush(self):
+        if time.time() - self._compacted_at >= COMPACT_INTERVAL:
+            self.compact()
+            return
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+    def compact(self):
+        """Rewrite the log with only the ids still within `days`"""
+        with self._lock:
+            cutoff = self._cutoff()
+            for action_id, date in self.ids.items():
+                if date < cutoff:
+                    del self.ids[action_id]
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            tmp_path = '%s.tmp' % (self.path,)
+            with open(tmp_path, 'w') as f:
+                for action_id, date in sorted(self.ids.iteritems(), key=lambda i: i[1]):
+                    f.write('%s %s\n' % (action_id, date))
+            os.rename(tmp_path, self.path)
+            self._stale = 0
+            self._compacted_at = time.time()
@@ -0,0 +1,23 @@
+"""The check() helper and totals shared by the test scripts"""
+
+import sys
+
+
+passed = 0
+failed = 0
+
+def check(name, actual, expected):
+    global passed, failed
+    if actual == expected:
+        passed += 1
+    else:
+        failed += 1
+        print name
+        print '   expected', repr(expected)[:200]
+        print '   actual  ', repr(actual)[:200]
+
+def finish():
+    """Print the totals, exiting 1 if anything failed"""
+    print passed, 'passed,', failed, 'failed'
+    if failed > 0:
+        sys.exit(1)
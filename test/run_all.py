@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+"""Run test.py and every test_*.py, each in its own process"""
+
+import glob
+import os
+import subprocess
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+failures = []
+scripts = sorted(glob.glob(os.path.join(TEST_DIR, 'test*.py')))
+for script in scripts:
+    name = os.path.basename(script)
+    print '%-24s' % (name,),
+    sys.stdout.flush()
+    proc = subprocess.Popen([sys.executable, script], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = proc.communicate()[0]
+    lines = out.strip().split('\n')
+    print lines[-1]
+    if proc.returncode != 0:
+        failures.append(name)
+        print '   ' + '\n   '.join(lines[:-1][-20:])
+
+print len(scripts) - len(failures), 'scripts passed,', len(failures), 'failed'
+
+if failures:
+    sys.exit(1)
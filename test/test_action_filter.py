@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""Check that action filtering only drops what would render as nothing"""
+
+import glob
+import json
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from action import Action
+from action_filter import ActionFilter, parse_types, rendered_types, silent_update
+from action_printer import ActionPrinter
+from checks import check, finish
+
+
+fixtures = {}
+for path in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+    with open(path) as f:
+        fixtures[os.path.basename(path)[:-5]] = json.load(f)
+
+printer = ActionPrinter()
+everything = ActionFilter()
+rendered = ActionFilter.rendered()
+for name, a in sorted(fixtures.items()):
+    renders = printer.get_message(Action(a)) is not None
+    check('%s kept by default' % (name,), everything.wanted(a), renders or not silent_update(a))
+    check('%s kept when rendered' % (name,), rendered.wanted(a), renders)
+
+check('silent update', silent_update(fixtures['updateCard_pos']), True)
+check('cover update', silent_update(fixtures['updateCard_attachment']), True)
+check('list move is not silent', silent_update(fixtures['updateCard_list']), False)
+moved = dict(fixtures['updateCard_pos'])
+moved['data'] = dict(moved['data'], old={'pos' : 1, 'idList' : 'x'})
+check('list move with pos', everything.wanted(moved), True)
+
+check('every type by default', everything.param(), 'all')
+check('no silent types', 'moveCardToBoard' in rendered_types(), False)
+check('handlers', 'commentCard' in rendered_types(), True)
+custom = ActionFilter.rendered(allow=['addLabelToCard'], deny=['commentCard'])
+check('allowed', custom.wanted({'type' : 'addLabelToCard', 'data' : {}}), True)
+check('denied', custom.wanted(fixtures['commentCard']), False)
+check('unknown dropped', custom.wanted({'type' : 'createCheckItem', 'data' : {}}), False)
+check('param', custom.param().split(',') == sorted(custom.types), True)
+check('parse', parse_types(' a, b,,c '), ['a', 'b', 'c'])
+
+finish()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""Check Backfill pages, resumes after a failure and replays oldest first"""
+
+from multiprocessing.pool import ThreadPool
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from backfill import Backfill
+from checks import check, finish
+from merge import merge_actions, ordered
+from scheduler import PollError
+
+
+class StandInFetcher(object):
+    """Serves board histories the way Trello pages them, newest first"""
+    def __init__(self, history):
+        self.history = history
+        self.pool = ThreadPool(2)
+        self.requests = 0
+        self.fail_at = None
+    def board_actions(self, board_id, since=None, before=None, limit=1000):
+        self.requests += 1
+        if self.requests == self.fail_at:
+            raise PollError('stand-in failure', 503)
+        actions = [a for a in self.history[board_id] if before is None or a['id'] < before]
+        return sorted(actions, key=lambda a: a['id'], reverse=True)[:limit]
+
+
+def action(board, n):
+    return {'id' : '%s-%03d' % (board, n), 'date' : '2014-01-01T00:%02d:%02d.000Z' % (n / 60, n % 60)}
+
+history = {
+    'b1' : [action('b1', n) for n in range(0, 50, 2)],
+    'b2' : [action('b2', n) for n in range(1, 50, 3)],
+    'b3' : []
+}
+boards = [{'id' : b, 'name' : b.upper()} for b in sorted(history)]
+expected = sorted(history['b1'] + history['b2'], key=lambda a: a['date'])
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    spool = os.path.join(tmp_dir, 'spool')
+    fetcher = StandInFetcher(history)
+    fetcher.fail_at = 3
+
+    backfill = Backfill(fetcher, spool, page_size=4)
+    check('fresh start', backfill.load(), False)
+    try:
+        backfill.fetch(boards)
+        check('failure raised', None, PollError)
+    except PollError:
+        check('failure raised', PollError, PollError)
+
+    backfill = Backfill(fetcher, spool, page_size=4)
+    check('resumed', backfill.load(), True)
+    check('nothing posted yet', backfill.posted, None)
+    backfill.fetch(boards)
+    # 7 + 5 + 1 pages (the last short or empty) plus the failed request
+    check('no page fetched twice', fetcher.requests, 7 + 5 + 1 + 1)
+
+    replayed = list(merge_actions([ordered(b['actions']) for b in backfill.replay()]))
+    check('oldest first', replayed, expected)
+    check('board names', [b['name'] for b in backfill.replay()], ['B1', 'B2', 'B3'])
+
+    skip = expected[20]['date']
+    replayed = list(merge_actions([ordered(b['actions']) for b in backfill.replay(skip_before=skip)]))
+    check('skips posted', replayed, expected[20:])
+    backfill.mark_posted(skip)
+    resumed = Backfill(fetcher, spool, page_size=4)
+    resumed.load()
+    check('posted date kept with the spool', resumed.posted, skip)
+    check('newest', backfill.newest(), {'b1' : history['b1'][-1]['date'], 'b2' : history['b2'][-1]['date']})
+
+    backfill.finish()
+    check('spool removed', os.path.exists(spool), False)
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""Check per-board cursors are only saved once committed"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from boards import BoardCursors
+from checkpoint import Checkpoint
+from checks import check, finish
+
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, 'boards')
+
+    c = BoardCursors(Checkpoint(path)).load()
+    check('default for unknown board', c.get('b1', 'since'), 'since')
+    c.advance('b1', '2014-01-01T00:00:02.000Z')
+    c.advance('b1', '2014-01-01T00:00:01.000Z')
+    c.advance('b2', '2014-01-01T00:00:05.000Z')
+    check('staged only', c.get('b1'), None)
+    c.rewind()
+    c.commit()
+    check('rewound', os.path.exists(path), False)
+
+    c.advance('b1', '2014-01-01T00:00:02.000Z')
+    c.advance('b1', '2014-01-01T00:00:01.000Z')
+    c.commit()
+    check('latest date kept', c.get('b1'), '2014-01-01T00:00:02.000Z')
+    check('saved', json.load(open(path)), {'b1' : '2014-01-01T00:00:02.000Z'})
+
+    c = BoardCursors(Checkpoint(path)).load()
+    check('reloaded', c.get('b1'), '2014-01-01T00:00:02.000Z')
+    c.advance('b1', '2014-01-01T00:00:00.000Z')
+    c.commit()
+    check('never moves back', c.get('b1'), '2014-01-01T00:00:02.000Z')
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
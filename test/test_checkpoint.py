@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""Check Checkpoint batching and atomic replacement"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checkpoint import Checkpoint
+from checks import check, finish
+
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, 'date')
+
+    c = Checkpoint(path, every=3, interval=3600, fsync=True)
+    check('default when missing', c.load('default'), 'default')
+    c.advance('a')
+    c.advance('b')
+    check('not due before N', c.due(), False)
+    check('nothing written yet', os.path.exists(path), False)
+    c.advance('c')
+    check('due after N', c.due(), True)
+    c.flush()
+    check('flushed value', open(path).read(), 'c')
+    check('no temp file left', os.listdir(tmp_dir), ['date'])
+    check('not due after flush', c.due(), False)
+    c.flush()
+    check('clean flush is a no-op', c.flushes, 1)
+
+    c = Checkpoint(path, every=0, interval=0)
+    check('resumes saved value', c.load('default'), 'c')
+    c.advance('d')
+    check('due after interval', c.due(), True)
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
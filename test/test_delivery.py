@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""Check Delivery keeps per-key ordering while running in parallel"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from delivery import Delivery, HIGH, LOW
+
+
+received = {}
+lock = threading.Lock()
+
+def send(item):
+    key, n = item
+    time.sleep(random.random() * 0.002)
+    with lock:
+        received.setdefault(key, []).append(n)
+
+keys = ['subject %d' % (i,) for i in range(10)]
+expected = {}
+delivery = Delivery(send, workers=4, queue_size=5)
+for n in range(200):
+    key = random.choice(keys)
+    expected.setdefault(key, []).append(n)
+    delivery.submit(key, (key, n))
+delivery.join()
+delivery.close()
+
+for key in keys:
+    check(key, received.get(key), expected.get(key))
+
+# Priorities: everything is queued while the first item is being sent
+gate = threading.Event()
+order = []
+def gated(item):
+    if item == 'gate':
+        gate.wait()
+    order.append(item)
+delivery = Delivery(gated, workers=1, queue_size=2, high_queue_size=4)
+delivery.submit('g', 'gate')
+time.sleep(0.05)
+delivery.submit('a', 'a low', LOW)
+delivery.submit('b', 'b normal')
+check('backlog', delivery.backlog(), 2)
+# The queue is full, but high priority items still go in
+delivery.submit('c', 'c high', HIGH)
+delivery.submit('a', 'a high', HIGH)
+check('high not held back', delivery.backlog(), 4)
+# ...up to their own bound
+blocked = threading.Thread(target=delivery.submit, args=('d', 'd high', HIGH))
+blocked.start()
+time.sleep(0.05)
+check('high bounded', (delivery.backlog(), blocked.is_alive()), (4, True))
+gate.set()
+blocked.join()
+delivery.join()
+# 'a' jumps ahead as a whole, keeping its own order; 'd' only goes in
+# once there is room, so where it lands depends on timing
+check('high first, keys kept in order',
+      [item for item in order if item != 'd high'],
+      ['gate', 'a low', 'c high', 'a high', 'b normal'])
+check('sent by class', delivery.sent, [3, 2, 1])
+delivery.close()
+
+finish()
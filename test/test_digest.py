@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+"""Check Digest grouping, caps and ordering"""
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from digest import Digest
+
+
+def date(s):
+    return '2014-01-01T00:%02d:%02d.000Z' % (s / 60, s % 60)
+
+posts = []
+def emit(subject, actions, content):
+    posts.append((subject, [a[0] for a in actions], content))
+
+d = Digest(emit, window=0)
+d.add('a', date(0), 'x1', u'one')
+check('no window posts at once', posts, [('a', ['x1'], u'one')])
+
+del posts[:]
+d = Digest(emit, window=30, max_count=3)
+d.add('a', date(0), 'a1', u'a one')
+d.add('b', date(1), 'b1', u'b one')
+d.add('a', date(2), 'a2', u'a two')
+d.add('a', date(3), 'a3', u'a three')
+d.add('a', date(4), 'a4', u'a four')
+check('count cap', posts, [('a', ['a1', 'a2', 'a3'], u'a one\na two\na three')])
+d.add('b', date(40), 'b2', u'b two')
+check('window expiry', posts[1:], [('b', ['b1'], u'b one'), ('a', ['a4'], u'a four')])
+d.flush()
+check('flush', posts[3:], [('b', ['b2'], u'b two')])
+check('stats', (d.messages, d.posts), (6, 4))
+
+del posts[:]
+d = Digest(emit, window=30, max_chars=20)
+d.add('a', date(0), 'a1', u'0123456789')
+d.add('a', date(1), 'a2', u'0123456789')
+d.flush()
+check('size cap', [p[1] for p in posts], [['a1'], ['a2']])
+
+del posts[:]
+d = Digest(emit, window=30)
+d.add('a', date(0), 'a1', u'commented \n>quote')
+d.add('a', date(1), 'a2', u'next')
+d.flush()
+check('quote ends before next entry', posts[0][2], u'commented \n>quote\n\nnext')
+
+finish()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Check the member, board and list name directory"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from action import Action
+from action_printer import ActionPrinter
+from checks import check, finish
+from directory import Directory
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+org = {
+    'id' : 'org',
+    'members' : [{'id' : 'm1', 'fullName' : u'Member One'}, {'id' : 'm2', 'fullName' : u'Member Two'}],
+    'boards' : [{'id' : 'b1', 'name' : u'Board One', 'lists' : [{'id' : 'l1', 'name' : u'To Do'}]}]
+}
+board = {'id' : 'b2', 'name' : u'Board Two', 'members' : [], 'lists' : [{'id' : 'l2', 'name' : u'Done'}]}
+
+with open(os.path.join(TEST_DIR, 'actions', 'addMemberToBoard.json')) as f:
+    added = json.load(f)
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, 'directory')
+    clock = Clock()
+    d = Directory(path, ttl=100, size=10, clock=clock)
+    check('due before warming', d.due('org'), True)
+    d.warm('org', org)
+    d.warm('b2', board)
+    check('not due after', d.due('org'), False)
+    check('member', d.get('member', 'm2'), u'Member Two')
+    check('org board', d.get('board', 'b1'), u'Board One')
+    check('org list', d.get('list', 'l1'), u'To Do')
+    check('board itself', d.get('board', 'b2'), u'Board Two')
+    check('board list', d.get('list', 'l2'), u'Done')
+    check('unknown', d.get('member', 'nobody'), None)
+    check('counted', (d.hits, d.misses), (5, 1))
+
+    d.learn(added)
+    check('creator learned', d.get('member', 'mcidmcidmcidmcidmcidmcid'), u'Member Creator Full Name')
+    check('board renamed', d.get('board', 'b1idb1idb1idb1idb1idb1id'), u'Board One')
+
+    printer = ActionPrinter()
+    check('no directory, no message', printer.get_message(Action(added)), None)
+    printer = ActionPrinter(d)
+    check('member not known', printer.get_message(Action(added)), None)
+    d.put('member', added['data']['idMemberAdded'], u'New Member')
+    check('member named', printer.get_message(Action(added)),
+          u'Member Creator Full Name added **New Member** to board '
+          u'[Board One](https://trello.com/board/b1idb1idb1idb1idb1idb1id)')
+
+    d.save(force=True)
+    clock.now += 60
+    d.put('member', 'm1', u'Member One Renamed')
+    check('renamed', d.get('member', 'm1'), u'Member One Renamed')
+
+    clock.now += 50
+    check('expired', d.get('member', 'm2'), None)
+    check('refreshed kept', d.get('member', 'm1'), u'Member One Renamed')
+    check('due again', d.due('org'), True)
+
+    for i in range(20):
+        d.put('list', 'x%d' % (i,), u'List %d' % (i,))
+    check('size bounded', len(d.entries), 10)
+    check('oldest stored dropped', d.get('member', 'm1'), None)
+
+    clock.now = 1000.0 + 10
+    loaded = Directory(path, ttl=100, clock=clock).load()
+    check('persisted', loaded.get('member', 'm1'), u'Member One')
+    check('warm times persisted', loaded.due('org'), False)
+    clock.now += 200
+    check('expired on load', len(Directory(path, ttl=100, clock=clock).load().entries), 0)
+    check('missing file', len(Directory(os.path.join(tmp_dir, 'none')).load().entries), 0)
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""Check incremental parsing against json.loads for any chunk size"""
+
+import glob
+import json
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from ingest import FormatError, iter_boards
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+actions = []
+for action_file in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+    with open(action_file) as f:
+        actions.append(json.load(f))
+
+boards = [
+    {'id' : 'b%d' % (i,), 'name' : u'Board \u2713 %d' % (i,), 'actions' : actions[i::3]}
+    for i in range(3)
+]
+org_text = json.dumps({'id' : 'org', 'actions' : actions[:2], 'boards' : boards, 'idx' : 12345})
+list_text = json.dumps({'actions' : actions}, indent=2)
+
+for size in (1, 7, 4096, len(org_text)):
+    check('org chunk %d' % (size,), list(iter_boards(chunked(org_text, size))), boards)
+    check('list chunk %d' % (size,), list(iter_boards(chunked(list_text, size))), [{'actions' : actions}])
+
+check('empty boards', list(iter_boards(['{"boards": [] }'])), [])
+
+try:
+    list(iter_boards(['{"id": "x"}']))
+    check('unknown format', None, FormatError)
+except FormatError:
+    check('unknown format', FormatError, FormatError)
+
+try:
+    list(iter_boards(chunked(org_text[:len(org_text) / 2], 100)))
+    check('truncated', None, ValueError)
+except ValueError:
+    check('truncated', ValueError, ValueError)
+
+finish()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""Check field projection parameters and conditional request bookkeeping"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from action import ACTION_FIELDS
+from checks import check, finish
+from lean import Conditional, action_params
+
+
+class Raw(object):
+    def __init__(self, size):
+        self.size = size
+    def tell(self):
+        return self.size
+
+class Response(object):
+    def __init__(self, status_code, headers=None, wire=0):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.raw = Raw(wire)
+        self.closed = False
+    def close(self):
+        self.closed = True
+
+params = action_params()
+check('fields', params['fields'], ','.join(ACTION_FIELDS))
+check('member fields', params['memberCreator_fields'], 'fullName')
+check('prefixed', sorted(action_params('board_actions_').keys()),
+      sorted('board_actions_' + k for k in params.keys()))
+
+url = 'https://trello.example/1/boards/b1/actions'
+query = {'since' : '2014-01-01', 'key' : 'k', 'token' : 't'}
+c = Conditional(size=2)
+check('nothing remembered', c.headers(url, query), {})
+
+c.remember(url, query, Response(200, {'ETag' : '"abc"', 'Last-Modified' : 'Wed, 01 Jan 2014 00:00:00 GMT'}), 120)
+check('validators sent back', c.headers(url, query),
+      {'If-None-Match' : '"abc"', 'If-Modified-Since' : 'Wed, 01 Jan 2014 00:00:00 GMT'})
+check('credentials not part of the key', c.headers(url, dict(query, token='other')), c.headers(url, query))
+check('other since is another request', c.headers(url, dict(query, since='2014-01-02')), {})
+
+c.remember(url, dict(query, since='2014-01-02'), Response(200), 50)
+check('no validators, nothing remembered', c.headers(url, dict(query, since='2014-01-02')), {})
+
+ok = Response(200)
+check('200 is not a 304', c.check(url, query, ok), False)
+check('200 left open', ok.closed, False)
+r = Response(304)
+check('304', c.check(url, query, r), True)
+check('304 closed', r.closed, True)
+check('not modified counted', (c.not_modified, c.saved), (1, 120))
+
+check('wire size', c.count(Response(200, wire=30), 100), 30)
+check('bytes counted', (c.wire, c.decoded), (30, 100))
+
+c.remember(url, dict(query, since='a'), Response(200, {'ETag' : '"a"'}), 1)
+c.remember(url, dict(query, since='b'), Response(200, {'ETag' : '"b"'}), 1)
+check('oldest forgotten', c.headers(url, query), {})
+check('newest kept', c.headers(url, dict(query, since='b')), {'If-None-Match' : '"b"'})
+
+finish()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""Check merge_actions against a plain sort"""
+
+import os
+import random
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from merge import merge_actions, ordered
+
+
+def action(date, board):
+    return {'date' : '2014-01-01T00:00:%02d.000Z' % (date,), 'board' : board}
+
+random.seed(1)
+boards = []
+for b in range(20):
+    dates = sorted(random.randint(0, 59) for i in range(random.randint(0, 30)))
+    boards.append([action(d, b) for d in dates])
+
+expected = []
+for b in boards:
+    expected += b
+expected.sort(key=lambda a: a['date'])
+
+check('ascending', list(merge_actions([ordered(b) for b in boards])), expected)
+check('descending', list(merge_actions([ordered(b[::-1]) for b in boards])), expected)
+shuffled = [random.sample(b, len(b)) for b in boards]
+check('unordered', list(merge_actions([ordered(b) for b in shuffled])), expected)
+check('no streams', list(merge_actions([])), [])
+check('lazy', next(merge_actions([iter([action(1, 0)]), iter([action(2, 1)])])), action(1, 0))
+
+finish()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""Check metric histograms and the Prometheus text output"""
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from metrics import Histogram, Metrics, NullMetrics
+
+
+h = Histogram((1, 10, 100))
+for v in (0.5, 1, 5, 50, 500):
+    h.observe(v)
+check('bucket counts', h.counts, [2, 1, 1, 1])
+check('sum and count', (h.sum, h.count), (556.5, 5))
+check('median bucket', h.quantile(0.5), 10)
+check('top bucket', h.quantile(1.0), float('inf'))
+
+m = Metrics()
+m.inc('zulip_failures_total', status=429)
+m.inc('zulip_failures_total', status=429)
+m.inc('zulip_failures_total', status='connection')
+m.observe('render_seconds', 0.002, type='commentCard')
+m.observe('render_seconds', 0.02, type='createCard')
+lines = m.render().splitlines()
+check('help line', '# HELP trello_to_zulip_zulip_failures_total Zulip post attempts that failed' in lines, True)
+check('counter by label', 'trello_to_zulip_zulip_failures_total{status="429"} 2' in lines, True)
+check('histogram type', '# TYPE trello_to_zulip_render_seconds histogram' in lines, True)
+check('cumulative buckets', [l for l in lines if l.startswith('trello_to_zulip_render_seconds_bucket{type="createCard"')][3:5],
+      ['trello_to_zulip_render_seconds_bucket{type="createCard",le="0.05"} 1',
+       'trello_to_zulip_render_seconds_bucket{type="createCard",le="0.1"} 1'])
+check('histogram count', 'trello_to_zulip_render_seconds_count{type="commentCard"} 1' in lines, True)
+check('unused metrics left out', [l for l in lines if 'lag_seconds' in l], [])
+check('stats line', m.stats_line(), 'metrics: render p50<=0.005s p99<=0.05s, 3 post failures')
+
+n = NullMetrics()
+n.inc('zulip_failures_total')
+n.observe('render_seconds', 1.0, type='createCard')
+check('off', (n.enabled, n.render()), (False, ''))
+
+finish()
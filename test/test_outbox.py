@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+"""Check Outbox persistence across reopening"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from outbox import Outbox
+
+
+def params(content):
+    return {'subject' : u'Card', 'content' : content}
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, 'outbox')
+
+    o = Outbox(path, batch=2).open()
+    check('empty', len(o), 0)
+    first = o.put(u'Card', [('a1', '2014-01-01T00:00:01.000Z')], params(u'one'))
+    second = o.put(u'Card', [('a2', '2014-01-01T00:00:02.000Z'), ('a3', '2014-01-01T00:00:03.000Z')], params(u'two \u2713'))
+    o.put(u'Other', [('a4', '2014-01-01T00:00:04.000Z')], params(u'three'))
+    check('queued ids', ('a3' in o, 'a9' in o), (True, False))
+    o.commit()
+    o.done(first)
+    check('done forgets ids', 'a1' in o, False)
+    check('done counted', len(o), 2)
+    # Stop without committing the done() above
+    o._db.close()
+
+    o = Outbox(path, batch=2).open()
+    rows = list(o.pending())
+    check('uncommitted done is kept', [r[0] for r in rows], [1, 2, 3])
+    check('row round trip', rows[1], second)
+    check('ids reloaded', 'a1' in o and 'a4' in o, True)
+    o.done(rows[0])
+    o.done(rows[1])
+    o._db.close()
+
+    o = Outbox(path).open()
+    rows = list(o.pending())
+    check('batched done is committed', [(r[0], r[1]) for r in rows], [(3, u'Other')])
+    check('stats', o.stats_line(), 'outbox: 0 queued, 0 posted, 1 waiting')
+    o.close()
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""Check Stage, and that --pipeline posts exactly what the plain loop posts,
+running the script against local Trello and Zulip stand-ins"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urlparse
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(TEST_DIR, '..', 'trello-to-zulip.py')
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from pipeline import Stage
+
+
+#
+# Stage
+#
+check('order kept', list(Stage(xrange(100), depth=3)), range(100))
+
+def slow_consumer():
+    stage = Stage(xrange(20), depth=2)
+    out = []
+    for i in stage:
+        time.sleep(0.01)
+        out.append(i)
+    return out, stage.full > 0
+check('producer waits when full', slow_consumer(), (range(20), True))
+
+def failing():
+    yield 1
+    yield 2
+    raise ValueError('bad input')
+def read_failing():
+    out = []
+    try:
+        for i in Stage(failing()):
+            out.append(i)
+    except ValueError as e:
+        out.append(str(e))
+    return out
+check('error after items', read_failing(), [1, 2, 'bad input'])
+
+closed = []
+def endless():
+    try:
+        i = 0
+        while True:
+            yield i
+            i += 1
+    finally:
+        closed.append(True)
+stage = Stage(endless(), depth=2)
+for i in stage:
+    if i == 5:
+        break
+stage.thread.join(5)
+check('early stop ends producer', (stage.thread.is_alive(), closed), (False, [True]))
+
+#
+# Trello and Zulip stand-ins
+#
+def make_boards():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+        with open(path) as f:
+            fixtures.append(json.load(f))
+    boards = [{'id' : 'b%d' % (b,), 'name' : 'Board %d' % (b,), 'actions' : []} for b in range(3)]
+    # Enough actions for the response to span many read chunks
+    for i in range(300):
+        a = dict(fixtures[i % len(fixtures)])
+        a['id'] = 'a%05d' % (i,)
+        a['date'] = '2014-01-01T%02d:%02d:%02d.000Z' % (i / 3600, i / 60 % 60, i % 60)
+        boards[i % 3]['actions'].insert(0, a)
+    return boards
+
+BOARDS = make_boards()
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    posts = []
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        since = query.get('board_actions_since', [''])[0]
+        boards = [dict(b, actions=[a for a in b['actions'] if a['date'] > since]) for b in BOARDS]
+        self._reply(json.dumps({'id' : 'org', 'boards' : boards}))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = urlparse.parse_qs(self.rfile.read(length))
+        StandIn.posts.append((form['to'][0], form['subject'][0], form['content'][0]))
+        self._reply('{"result": "success"}')
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+server = Server(('127.0.0.1', 0), StandIn)
+thread = threading.Thread(target=server.serve_forever)
+thread.daemon = True
+thread.start()
+base_url = 'http://127.0.0.1:%d' % (server.server_address[1],)
+
+def run(*args):
+    """Posts and saved date for one --once run from an empty state"""
+    del StandIn.posts[:]
+    work_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(work_dir, 'config.json'), 'w') as f:
+            json.dump({
+                'TRELLO_KEY' : 'key', 'TRELLO_TOKEN' : 'token', 'TRELLO_ORG' : 'org',
+                'ZULIP_EMAIL' : 'bot@example.com', 'ZULIP_KEY' : 'key', 'ZULIP_STREAM' : 'trello',
+                'TRELLO_URL' : base_url + '/1', 'ZULIP_URL' : base_url + '/api/v1/messages'
+            }, f)
+        with open(os.path.join(work_dir, '.trello-to-zulip-date'), 'w') as f:
+            f.write('2000-01-01T00:00:00.000Z')
+        command = [sys.executable, SCRIPT, '--config=config.json', '--once', '--seen-days=100000',
+                   '--post-concurrency=1', '--digest-window=86400'] + list(args)
+        status = subprocess.call(command, cwd=work_dir)
+        with open(os.path.join(work_dir, '.trello-to-zulip-date')) as f:
+            date = f.read()
+        return status, list(StandIn.posts), date
+    finally:
+        shutil.rmtree(work_dir)
+
+plain = run()
+piped = run('--pipeline', '--pipeline-depth=1')
+check('plain run', (plain[0], len(plain[1]) > 5, plain[2]), (0, True, '2014-01-01T00:04:59.000Z'))
+check('pipeline run', piped[0], 0)
+check('pipeline posts the same, in order', piped[1] == plain[1], True)
+check('pipeline saves the same date', piped[2], plain[2])
+
+server.shutdown()
+
+finish()
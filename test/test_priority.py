@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""Check priority classes of actions"""
+
+import glob
+import json
+import os
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from action import Action
+from checks import check, finish
+from delivery import HIGH, LOW, NORMAL
+from priority import Priorities, parse_priorities
+
+
+fixtures = {}
+for path in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+    with open(path) as f:
+        fixtures[os.path.basename(path)[:-5]] = Action(json.load(f))
+
+priorities = Priorities()
+for name, expected in (('commentCard', HIGH), ('createCard', HIGH), ('deleteCard', HIGH),
+                       ('addMemberToCard', NORMAL), ('updateCard_list', NORMAL),
+                       ('updateCard_closed', NORMAL), ('updateCard_name', NORMAL),
+                       ('updateCard_due', LOW), ('updateCard_desc', LOW), ('updateCard_pos', LOW),
+                       ('updateCheckItemStateOnCard_state', LOW), ('updateBoard_prefsVoting', LOW)):
+    check(name, priorities.of(fixtures[name]), expected)
+
+moved = json.load(open(os.path.join(TEST_DIR, 'actions', 'updateCard_pos.json')))
+moved['data']['old']['idList'] = 'x'
+check('move with pos', priorities.of(Action(moved)), NORMAL)
+
+overrides = parse_priorities(['updateCheckItemStateOnCard=high', 'commentCard=low', 'updateCard=high'])
+check('parsed', overrides, {'updateCheckItemStateOnCard' : HIGH, 'commentCard' : LOW, 'updateCard' : HIGH})
+custom = Priorities(overrides)
+check('override raises', custom.of(fixtures['updateCheckItemStateOnCard_state']), HIGH)
+check('override lowers', custom.of(fixtures['commentCard']), LOW)
+check('override updateCard', custom.of(fixtures['updateCard_due']), HIGH)
+for bad in (['commentCard'], ['commentCard=urgent']):
+    try:
+        parse_priorities(bad)
+        error = None
+    except ValueError as e:
+        error = e
+    check('rejects %r' % (bad,), error is not None, True)
+
+finish()
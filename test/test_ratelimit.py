@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""Check RateLimiter pacing and header learning against a fake clock"""
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from ratelimit import RateLimiter
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+    def time(self):
+        return self.now
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+c = Clock()
+r = RateLimiter(clock=c.time, sleep=c.sleep)
+for i in range(5):
+    r.acquire()
+check('unlimited never sleeps', c.sleeps, [])
+
+c = Clock()
+r = RateLimiter(2, clock=c.time, sleep=c.sleep)
+for i in range(3):
+    r.acquire()
+check('paced at rate', c.sleeps, [0.5, 0.5])
+check('achieved rate', r.achieved(), 3.0)
+
+c = Clock()
+r = RateLimiter(2, clock=c.time, sleep=c.sleep)
+r.acquire()
+c.now += 10
+r.acquire()
+check('idle time refills one token only', c.sleeps, [])
+r.acquire()
+check('burst of one', c.sleeps, [0.5])
+
+c = Clock()
+r = RateLimiter(clock=c.time, sleep=c.sleep)
+r.learn(200, {'X-RateLimit-Remaining' : '100', 'X-RateLimit-Reset' : str(c.now + 50)})
+check('zulip headers set rate', round(r.rate, 3), 1.8)
+r.learn(200, {'X-RateLimit-Remaining' : '0', 'X-RateLimit-Reset' : str(c.now + 20)})
+r.acquire()
+check('zulip exhausted pauses until reset', c.sleeps, [20.0])
+
+c = Clock()
+r = RateLimiter(clock=c.time, sleep=c.sleep)
+r.learn(200, {'X-Rate-Limit-Api-Token-Max' : '100', 'X-Rate-Limit-Api-Token-Interval-Ms' : '10000',
+              'X-Rate-Limit-Api-Token-Remaining' : '42'})
+check('trello headers set rate', round(r.rate, 3), 9.0)
+
+c = Clock()
+r = RateLimiter(4, clock=c.time, sleep=c.sleep)
+r.learn(429, {'Retry-After' : '3'})
+check('429 halves rate', r.rate, 2.0)
+check('429 counted', r.throttled, 1)
+r.acquire()
+check('429 honours retry-after', c.sleeps, [3.0])
+r.learn(429, {})
+r.acquire()
+check('429 default pause', c.sleeps[-1], 1.0)
+check('time waited', r.waited, 4.0)
+
+finish()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""Check finding, reading and rendering archived dumps"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from replay import dump_paths, open_dump, render_dump, render_dumps
+
+
+fixtures = []
+for path in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+    with open(path) as f:
+        fixtures.append(json.load(f))
+
+def dump(n):
+    """Two boards, newest first, with interleaved dates"""
+    boards = []
+    for b in range(2):
+        actions = []
+        for i in range(b, len(fixtures), 2):
+            a = dict(fixtures[i])
+            a['id'] = 'd%d-%03d' % (n, i)
+            a['date'] = '2014-01-0%dT00:00:%02d.000Z' % (n + 1, i)
+            actions.insert(0, a)
+        boards.append({'id' : 'b%d' % (b,), 'name' : 'Board %d' % (b,), 'actions' : actions})
+    return json.dumps({'id' : 'org', 'boards' : boards})
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    dumps = os.path.join(tmp_dir, 'dumps')
+    os.mkdir(dumps)
+    with open(os.path.join(dumps, '1.json'), 'w') as f:
+        f.write(dump(1))
+    with gzip.open(os.path.join(dumps, '2.json.gz'), 'wb') as f:
+        f.write(dump(2))
+    with open(os.path.join(dumps, '0.json'), 'w') as f:
+        f.write(dump(0))
+    os.mkdir(os.path.join(dumps, 'subdir'))
+
+    paths = dump_paths([dumps])
+    check('directory, sorted, files only', [os.path.basename(p) for p in paths], ['0.json', '1.json', '2.json.gz'])
+    check('glob', [os.path.basename(p) for p in dump_paths([os.path.join(dumps, '*.gz')])], ['2.json.gz'])
+    with open_dump(paths[2]) as f:
+        check('gzip by content', f.read(), dump(2))
+
+    path, count, rendered = render_dump(paths[1])
+    check('every action read', count, len(fixtures))
+    dates = [r[1] for r in rendered]
+    check('oldest first across boards', dates, sorted(dates))
+    check('messages rendered', len(rendered) > 0 and all(r[3] for r in rendered), True)
+
+    serial = list(render_dumps(paths))
+    parallel = list(render_dumps(paths, processes=2))
+    check('dump order kept', [r[0] for r in parallel], paths)
+    check('same with processes', parallel, serial)
+
+    with open(os.path.join(dumps, '3.json'), 'w') as f:
+        f.write('{"id": "org", "boards": [')
+    try:
+        render_dump(os.path.join(dumps, '3.json'))
+        error = None
+    except ValueError as e:
+        error = str(e)
+    check('truncated dump names the file', error is not None and error.startswith(os.path.join(dumps, '3.json')), True)
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""Check ROUTES parsing and per-route names"""
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from routes import Route, parse_routes
+
+
+def error(entries):
+    try:
+        parse_routes(entries)
+    except ValueError:
+        return True
+    return False
+
+single = Route('trello', org='acmeco')
+check('single route keeps file names', single.path('.trello-to-zulip-date'), '.trello-to-zulip-date')
+check('single route keeps ids', single.key('a1'), 'a1')
+check('single route label', single.label(), '')
+
+routes = parse_routes([
+    {'TRELLO_ORG' : 'acmeco', 'ZULIP_STREAM' : 'trello'},
+    {'TRELLO_BOARD' : 'b1', 'ZULIP_STREAM' : 'design', 'NAME' : 'design'},
+])
+check('named by org', routes[0].name, 'acmeco')
+check('named by NAME', routes[1].name, 'design')
+check('board route', (routes[1].org, routes[1].board, routes[1].stream), (None, 'b1', 'design'))
+check('file per route', routes[1].path('.trello-to-zulip-date'), '.trello-to-zulip-date.design')
+check('ids per stream', routes[1].key('a1'), 'design/a1')
+check('label', routes[0].label(), '[acmeco] ')
+
+check('empty list', error([]), True)
+check('not a list', error({'TRELLO_ORG' : 'acmeco'}), True)
+check('org and board', error([{'TRELLO_ORG' : 'a', 'TRELLO_BOARD' : 'b', 'ZULIP_STREAM' : 's'}]), True)
+check('no stream', error([{'TRELLO_ORG' : 'a'}]), True)
+check('entry not an object', error(['x']), True)
+check('org not a string', error([{'TRELLO_ORG' : 5, 'ZULIP_STREAM' : 's'}]), True)
+check('name not a string', error([{'TRELLO_ORG' : 'a', 'ZULIP_STREAM' : 's', 'NAME' : ['a']}]), True)
+check('duplicate name', error([{'TRELLO_ORG' : 'a', 'ZULIP_STREAM' : 's'},
+                               {'TRELLO_ORG' : 'a', 'ZULIP_STREAM' : 't'}]), True)
+
+finish()
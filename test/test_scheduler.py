@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""Check Scheduler interval decisions"""
+
+import os
+import sys
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from scheduler import Scheduler, retry_after
+
+
+s = Scheduler(60)
+check('fixed when idle', s.success(0), 60)
+check('fixed when active', s.success(10), 60)
+
+s = Scheduler(60, minimum=10, maximum=300, rand=lambda: 1.0)
+check('active halves', s.success(5), 30)
+check('active floor', [s.success(5) for i in range(5)][-1], 10)
+check('idle grows', s.success(0), 15)
+check('idle ceiling', [s.success(0) for i in range(20)][-1], 300)
+check('backoff 1', s.failure(503), 120)
+check('backoff 2', s.failure(None), 240)
+check('backoff cap', [s.failure(429) for i in range(10)][-1], 900)
+check('retry-after wins', s.failure(429, 3600), 3600)
+check('client error keeps interval', s.failure(401), 300)
+s.success(1)
+check('reset after success', s.failure(500), 120)
+
+s = Scheduler(60, rand=lambda: 0.0)
+check('jitter lower bound', s.failure(500), 60)
+
+check('retry-after seconds', retry_after({'Retry-After' : '7'}), 7)
+check('retry-after missing', retry_after({}), None)
+check('retry-after date', retry_after({'Retry-After' : 'Wed, 21 Oct 2015 07:28:00 GMT'}), None)
+
+finish()
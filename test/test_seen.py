@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""Check SeenIndex persistence and eviction"""
+
+from datetime import datetime, timedelta
+import os
+import shutil
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from seen import SeenIndex
+
+
+def days_ago(n):
+    return (datetime.utcnow() - timedelta(days=n)).isoformat()[:23] + 'Z'
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, 'seen')
+
+    s = SeenIndex(path, days=7).load()
+    check('empty without file', len(s), 0)
+    s.add('recent', days_ago(1))
+    s.add('old', days_ago(30))
+    s.add('recent', days_ago(1))
+    s.flush()
+    check('lookup', 'recent' in s, True)
+    check('unknown', 'other' in s, False)
+    check('duplicate add not logged', len(open(path).readlines()), 2)
+
+    s = SeenIndex(path, days=7).load()
+    check('reloaded recent', 'recent' in s, True)
+    check('evicted old', 'old' in s, False)
+
+    s.compact()
+    check('compacted log', [l.split()[0] for l in open(path)], ['recent'])
+finally:
+    shutil.rmtree(tmp_dir)
+
+finish()
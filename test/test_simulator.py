@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+"""Check the Trello and Zulip simulator, and run the script against it"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib2
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(TEST_DIR, '..', 'trello-to-zulip.py')
+
+sys.path.append(os.path.join(TEST_DIR, '..', 'bench'))
+
+from checks import check, finish
+from simulator import Feed, Simulator
+
+
+feed = Feed(3, 60, seed=2)
+board = feed.boards[0]
+newest = feed.actions(board)
+check('all of a board', len(newest), 20)
+check('newest first', [a['date'] for a in newest], sorted([a['date'] for a in newest], reverse=True))
+check('since', feed.actions(board, since=newest[5]['date']), newest[:5])
+check('before and limit', feed.actions(board, before=newest[5]['id'], limit=3), newest[6:9])
+types = set([newest[0]['type']])
+check('type filter', all(a['type'] in types for a in feed.actions(board, types=types)), True)
+
+feed.add_live()
+live = [b['actions'][-1] for b in feed.boards if b['actions'][-1]['data']['card']['name'] == u'Live card 0']
+check('live action is newest', (feed.generated, len(live)), (1, 1))
+check('live lag once', (feed.lag(u'Live card 0') >= 0, feed.lag(u'Live card 0')), (True, None))
+
+sim = Simulator(Feed(1, 1), zulip_limit=2, zulip_window=60)
+check('within limit', sim.fault('zulip')[0], None)
+status, headers = sim.fault('zulip')
+check('last allowed', (status, headers['X-RateLimit-Remaining']), (None, '0'))
+status, headers = sim.fault('zulip')
+check('over the limit', (status, 'Retry-After' in headers), (429, True))
+check('trello unlimited', sim.fault('trello'), (None, {}))
+check('errors', Simulator(Feed(1, 1), error_rate=1.0).fault('trello')[0], 503)
+
+#
+# The script, paging through history and posting it
+#
+sim = Simulator(Feed(3, 30, seed=3), record=tempfile.TemporaryFile())
+trello_url, zulip_url = sim.start(port=0, zulip_port=0)
+
+def make_work_dir(date=None):
+    """Config for the simulator, and optionally a date file left from polling"""
+    work_dir = tempfile.mkdtemp()
+    with open(os.path.join(work_dir, 'config.json'), 'w') as f:
+        json.dump({
+            'TRELLO_KEY' : 'key', 'TRELLO_TOKEN' : 'token', 'TRELLO_ORG' : 'org',
+            'ZULIP_EMAIL' : 'bot@example.com', 'ZULIP_KEY' : 'key', 'ZULIP_STREAM' : 'trello',
+            'TRELLO_URL' : trello_url, 'ZULIP_URL' : zulip_url
+        }, f)
+    if date is not None:
+        with open(os.path.join(work_dir, '.trello-to-zulip-date'), 'w') as f:
+            f.write(date)
+    return work_dir
+
+def run(work_dir, *args):
+    """Exit status and --output lines of one --once --all run"""
+    command = [sys.executable, SCRIPT, '--config=config.json', '--once', '--all', '--seen-days=100000',
+               '--page-size=4', '--digest-window=86400'] + list(args)
+    status = subprocess.call(command, cwd=work_dir)
+    lines = []
+    if os.path.exists(os.path.join(work_dir, 'messages.jsonl')):
+        with open(os.path.join(work_dir, 'messages.jsonl')) as f:
+            lines = f.readlines()
+    return status, lines
+
+def fail_request(service, n):
+    """Make the simulator answer the n-th request to service from now with a 503"""
+    fault = sim.fault
+    served = [0]
+    def failing(service_asked):
+        if service_asked == service:
+            served[0] += 1
+            if served[0] == n:
+                sim.fault = fault
+                return 503, {}
+        return fault(service_asked)
+    sim.fault = failing
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def push(url, action):
+    """POST a webhook callback, once the receiver is up"""
+    for i in range(100):
+        try:
+            return urllib2.urlopen(url, json.dumps(action)).getcode()
+        except urllib2.URLError:
+            time.sleep(0.1)
+
+def wait_for_posts(n, timeout=30):
+    deadline = time.time() + timeout
+    while sim.stats()['posted'] < n and time.time() < deadline:
+        time.sleep(0.1)
+    return sim.stats()['posted']
+
+work_dirs = [make_work_dir(), make_work_dir(), make_work_dir('2026-10-01T00:00:00.000Z'), make_work_dir()]
+try:
+    status, messages = run(work_dirs[0], '--output=messages.jsonl')
+    check('rendered', (status, len(messages) > 5), (0, True))
+    check('posted', run(work_dirs[1])[0], 0)
+    stats = json.loads(urllib2.urlopen(trello_url[:-len('/1')] + '/stats').read())
+    check('every message posted', (stats['posted'], stats['errors'], stats['trello'] > 3), (len(messages), 0, True))
+    sim.record.seek(0)
+    # Subjects are posted in parallel, so only the set is the same
+    check('recorded', sorted(json.loads(l)['content'] for l in sim.record),
+          sorted(json.loads(l)['content'] for l in messages))
+
+    # A backfill that failed while fetching resumes from the start, not
+    # from the date an earlier poll left behind
+    fail_request('trello', 4)
+    run(work_dirs[2])
+    posted = sim.stats()['posted']
+    check('resumed run', run(work_dirs[2])[0], 0)
+    check('resumed backfill posts everything', sim.stats()['posted'] - posted, len(messages))
+
+    # With webhooks and no polls, a post that fails is retried on its own,
+    # and the posts for the same card behind it stay in order
+    with open(os.path.join(TEST_DIR, 'actions', 'commentCard.json')) as f:
+        comment = json.load(f)
+    port = free_port()
+    webhook = subprocess.Popen([sys.executable, SCRIPT, '--config=config.json', '--seen-days=100000',
+                                '--webhook=%d' % (port,), '--reconcile=0', '--insecure-webhook'],
+                               cwd=work_dirs[3])
+    try:
+        posted = sim.stats()['posted']
+        sim.record.seek(0, os.SEEK_END)
+        start = sim.record.tell()
+        fail_request('zulip', 1)
+        texts = ['Pushed comment %d' % (i,) for i in range(3)]
+        for i, text in enumerate(texts):
+            comment['id'] = 'pushed%d' % (i,)
+            comment['data']['text'] = text
+            push('http://127.0.0.1:%d/' % (port,), comment)
+        check('pushed posts after a failure', wait_for_posts(posted + 3) - posted, 3)
+        sim.record.seek(start)
+        check('pushed posts in order', [t for l in sim.record for t in texts if t in json.loads(l)['content']], texts)
+    finally:
+        webhook.terminate()
+        webhook.wait()
+finally:
+    sim.stop()
+    for work_dir in work_dirs:
+        shutil.rmtree(work_dir)
+
+finish()
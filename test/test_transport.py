@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""Check connection reuse against a local HTTP stand-in"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import os
+import sys
+import threading
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from transport import Transport
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+        body = '{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_POST(self):
+        self._reply()
+
+    def log_message(self, *args):
+        pass
+
+
+server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+thread = threading.Thread(target=server.serve_forever)
+thread.daemon = True
+thread.start()
+url = 'http://127.0.0.1:%d/' % (server.server_address[1],)
+
+transport = Transport(pool_size=2, timeout=5)
+for i in range(5):
+    transport.get(url, params={'i' : i})
+    transport.post(url, data={'i' : i})
+stats = transport.stats()
+transport.close()
+server.shutdown()
+
+check('requests', stats['requests'], 10)
+check('connections', stats['connections'], 1)
+check('reused', stats['reused'], 9)
+
+print transport.stats_line()
+finish()
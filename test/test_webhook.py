@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""POST recorded actions to a local webhook receiver"""
+
+import glob
+import httplib
+import json
+import os
+import sys
+import urllib2
+
+TEST_DIR = os.path.dirname(__file__)
+
+sys.path.append(os.path.join(TEST_DIR, '..'))
+
+from checks import check, finish
+from webhook import WebhookServer, signature
+
+
+def post(url, body, headers={}):
+    try:
+        return urllib2.urlopen(urllib2.Request(url, body, headers)).getcode()
+    except urllib2.HTTPError as e:
+        return e.code
+
+def post_length(port, length):
+    """POST a small body with the given Content-Length header"""
+    conn = httplib.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.putrequest('POST', '/')
+    conn.putheader('Content-Length', length)
+    conn.endheaders()
+    conn.send('{}')
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+received = []
+server = WebhookServer(('127.0.0.1', 0), received.append)
+server.start()
+url = 'http://127.0.0.1:%d/' % (server.server_address[1],)
+
+expected = []
+for action_file in sorted(glob.glob(os.path.join(TEST_DIR, 'actions', '*.json'))):
+    with open(action_file) as f:
+        body = f.read()
+    expected.append(json.loads(body))
+    check(os.path.basename(action_file), post(url, body), 200)
+check('received in order', received, expected)
+
+del received[:]
+check('wrapped action', post(url, json.dumps({'action' : expected[0], 'model' : {}})), 200)
+check('unwrapped', received, expected[:1])
+check('no action', post(url, '{"model": {}}'), 400)
+check('not json', post(url, 'junk'), 400)
+check('bad content length', post_length(server.server_address[1], 'abc'), 400)
+check('negative content length', post_length(server.server_address[1], '-1'), 400)
+check('too large', post_length(server.server_address[1], str(2 * 1024 * 1024)), 413)
+server.shutdown()
+
+callback_url = 'https://example.com/trello'
+server = WebhookServer(('127.0.0.1', 0), received.append, secret=u'sekrit', callback_url=callback_url)
+server.start()
+url = 'http://127.0.0.1:%d/' % (server.server_address[1],)
+body = json.dumps({'action' : expected[0]})
+check('unsigned', post(url, body), 401)
+check('bad signature', post(url, body, {'X-Trello-Webhook' : 'bad'}), 401)
+check('signed', post(url, body, {'X-Trello-Webhook' : signature(u'sekrit', body, callback_url)}), 200)
+server.shutdown()
+
+finish()
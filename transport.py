@@ -0,0 +1,95 @@
+"""Shared HTTP transport with pooled, keep-alive connections per host"""
+
+import threading
+import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import RateLimiter
+
+
+DEFAULT_POOL_HOSTS  = 4
+DEFAULT_POOL_SIZE   = 8
+DEFAULT_TIMEOUT     = 30
+
+
+class Transport(object):
+    def __init__(self, pool_hosts=DEFAULT_POOL_HOSTS, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retired_connections = 0
+        self.limiters = {}
+    #
+    # Rate limiting, per host
+    #
+    def limiter(self, url, rate=None):
+        host = urlparse.urlparse(url).netloc
+        with self._lock:
+            limiter = self.limiters.get(host, None)
+            if limiter is None:
+                limiter = self.limiters[host] = RateLimiter(rate)
+            elif rate is not None:
+                limiter.rate = rate
+        return limiter
+    #
+    # Requests
+    #
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = self.limiter(url)
+        limiter.acquire()
+        with self._lock:
+            self._requests += 1
+        r = self.session.request(method, url, **kwargs)
+        limiter.learn(r.status_code, r.headers)
+        return r
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+    def close(self):
+        with self._lock:
+            self._retired_connections = self._open_connections()
+        self.session.close()
+    #
+    # Counters
+    #
+    def _open_connections(self):
+        pools = self.adapter.poolmanager.pools
+        total = self._retired_connections
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+        return total
+    def stats(self):
+        with self._lock:
+            num_requests = self._requests
+            num_connections = self._open_connections()
+        return {
+            'requests' : num_requests,
+            'connections' : num_connections,
+            'reused' : max(num_requests - num_connections, 0)
+        }
+    def stats_line(self):
+        s = self.stats()
+        line = 'http: %d requests, %d connections, %d reused' % (
+            s['requests'],
+            s['connections'],
+            s['reused']
+        )
+        for host, limiter in sorted(self.limiters.items()):
+            line += '; %s %.2f/s (limit %s, %d throttled, %.1fs waiting)' % (
+                host,
+                limiter.achieved(),
+                limiter.rate and ('%.2f/s' % (limiter.rate,)) or 'none',
+                limiter.throttled,
+                limiter.waited
+            )
+        return line
@@ -1,28 +1,103 @@
 #!/usr/bin/env python
 
 from argparse import ArgumentParser, FileType
+from collections import deque
 from datetime import datetime
-from time import sleep
+from multiprocessing.pool import ThreadPool
+from Queue import Empty, Queue
+from time import sleep, time
 import json
 import os
 import sys
+import threading
 
 import requests
 
 from action import Action
+from action_filter import ActionFilter, parse_types
 from action_printer import ActionPrinter
+from backfill import Backfill, PAGE_SIZE
+from boards import BoardCursors, BoardFetcher
+from checkpoint import Checkpoint, DEFAULT_EVERY, DEFAULT_INTERVAL
+from delivery import DEFAULT_QUEUE_SIZE, Delivery, LOW, NORMAL
+from directory import Directory, DEFAULT_TTL
+from digest import Digest, ZULIP_MESSAGE_MAX, parse_date
+from lean import action_params
+from ingest import CHUNK_SIZE, FormatError, decode_chunks, file_chunks, iter_boards
+from merge import merge_actions, ordered
+from metrics import Metrics, MetricsServer, NullMetrics
+from outbox import Outbox
+from replay import dump_paths, render_dumps
+from pipeline import Stage, DEFAULT_DEPTH
+from priority import Priorities, parse_priorities
+from routes import Route, parse_routes
+from scheduler import PollError, Scheduler, is_retryable, retry_after
+from seen import SeenIndex, DEFAULT_DAYS
+from transport import Transport, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from webhook import WebhookServer
 
 
 DATE_FILE           = '.trello-to-zulip-date'
+SEEN_FILE           = '.trello-to-zulip-seen'
+OUTBOX_FILE         = '.trello-to-zulip-outbox'
+BOARDS_FILE         = '.trello-to-zulip-boards'
+DIRECTORY_FILE      = '.trello-to-zulip-directory'
+BACKFILL_DIR        = '.trello-to-zulip-backfill'
+BOARD_LIST_INTERVAL = 60 * 60
+SHED_SUBJECT        = u'Skipped updates'
+POST_ATTEMPTS       = 8
+# Held posts are retried this long after failing, doubling up to the
+# maximum, when no poll comes first (with --webhook)
+RETRY_MIN_DELAY     = 2
+RETRY_MAX_DELAY     = 300
+# Delivery item asking a key's lane to retry the posts held for it
+RETRY               = 'retry'
+TRELLO_URL          = 'https://api.trello.com/1'
 ZULIP_URL           = 'https://zulip.com/api/v1/messages'
 
 parser = ArgumentParser(description='Read actions from Trello and post to Zulip')
-parser.add_argument('-a', '--all',      action='store_true',                help='read all available actions')
+parser.add_argument('-a', '--all',      action='store_true',                help='read all available actions (resumes an interrupted run)')
 parser.add_argument('-n', '--no-post',  action='store_true',                help='do not post messages')
 parser.add_argument('-o', '--once',     action='store_true',                help='read actions once and exit')
 parser.add_argument('-v', '--verbose',  action='store_true',                help='verbose progress output')
 parser.add_argument('-c', '--config',   metavar='C', type=FileType('r'),    help='file to load settings (ENV takes priority)') 
 parser.add_argument('-s', '--sleep',    metavar='S', type=int, default=60,  help='seconds to sleep between reading (default: 60)')
+parser.add_argument('--min-sleep',      metavar='S', type=int,              help='shortest sleep after polls that found actions (default: --sleep)')
+parser.add_argument('--max-sleep',      metavar='S', type=int,              help='longest sleep after idle polls (default: --sleep)')
+parser.add_argument('-w', '--webhook',  metavar='PORT', type=int,           help='receive Trello webhook callbacks on PORT instead of polling')
+parser.add_argument('--webhook-host',   metavar='H', default='127.0.0.1',   help='address to listen on for webhooks (default: 127.0.0.1)')
+parser.add_argument('--insecure-webhook', action='store_true',              help='accept unsigned webhook callbacks when TRELLO_SECRET is not set')
+parser.add_argument('--reconcile',      metavar='S', type=int, default=600, help='seconds between safety-net polls with --webhook, 0 to disable (default: 600)')
+parser.add_argument('-b', '--per-board', action='store_true',               help='fetch each board separately, with its own saved date')
+parser.add_argument('--fetch-concurrency', metavar='N', type=int, default=4, help='boards (with --per-board) and routes fetched in parallel (default: 4)')
+parser.add_argument('--page-size',      metavar='N', type=int, default=PAGE_SIZE, help='actions per request when paging through history with --all (default: %d)' % (PAGE_SIZE,))
+parser.add_argument('--metrics',        metavar='PORT', type=int,           help='serve Prometheus metrics on PORT at /metrics (--verbose also prints a summary)')
+parser.add_argument('--metrics-host',   metavar='H', default='127.0.0.1',   help='address to serve metrics on (default: 127.0.0.1)')
+parser.add_argument('--stream',         action='store_true',                help='post each board as soon as it is read (date order kept per board)')
+parser.add_argument('--directory',      action='store_true',                help='name members that actions only give the id of, from a cached directory')
+parser.add_argument('--directory-ttl',  metavar='S', type=int, default=DEFAULT_TTL, help='seconds before directory names are fetched again (default: %d)' % (DEFAULT_TTL,))
+parser.add_argument('--lean',           action='store_true',                help='request only the action fields used, and skip unchanged responses')
+parser.add_argument('--filter-types',   action='store_true',                help='only fetch action types that are rendered (unknown types are not posted)')
+parser.add_argument('--allow-types',    metavar='T,..', default='',         help='action types fetched with --filter-types even without a message of their own')
+parser.add_argument('--deny-types',     metavar='T,..', default='',         help='action types never fetched or posted (implies --filter-types)')
+parser.add_argument('--pipeline',       action='store_true',                help='download and decode Trello input on its own thread while rendering')
+parser.add_argument('--pipeline-depth', metavar='N', type=int, default=DEFAULT_DEPTH, help='chunks read ahead with --pipeline (default: %d)' % (DEFAULT_DEPTH,))
+parser.add_argument('--pool-size',      metavar='N', type=int, default=DEFAULT_POOL_SIZE, help='keep-alive connections per host (default: %d)' % (DEFAULT_POOL_SIZE,))
+parser.add_argument('--post-concurrency', metavar='N', type=int, default=4,  help='Zulip subjects posted in parallel (default: 4)')
+parser.add_argument('--priority',       metavar='TYPE=CLASS', action='append', default=[], help='post action TYPE as high, normal or low priority; repeatable')
+parser.add_argument('--shed-backlog',   metavar='N', type=int, default=0,   help='skip low priority messages while N posts are waiting (default: 0, never)')
+parser.add_argument('--digest-window',  metavar='S', type=int, default=0,   help='combine messages for a subject within S seconds into one post (default: 0, off)')
+parser.add_argument('--digest-max',     metavar='N', type=int, default=50,  help='most messages combined into one post (default: 50)')
+parser.add_argument('--checkpoint-every', metavar='N', type=int, default=DEFAULT_EVERY, help='save the last action date after N actions (default: %d)' % (DEFAULT_EVERY,))
+parser.add_argument('--checkpoint-interval', metavar='T', type=int, default=DEFAULT_INTERVAL, help='or after T seconds (default: %d)' % (DEFAULT_INTERVAL,))
+parser.add_argument('--fsync',          action='store_true',                help='fsync the saved date before replacing it')
+parser.add_argument('--seen-days',      metavar='D', type=int, default=DEFAULT_DAYS, help='days to remember posted action ids (default: %d)' % (DEFAULT_DAYS,))
+parser.add_argument('--zulip-rate',     metavar='R', type=float,            help='starting limit for Zulip requests per second (default: learned from responses)')
+parser.add_argument('--trello-rate',    metavar='R', type=float,            help='starting limit for Trello requests per second (default: learned from responses)')
+parser.add_argument('--timeout',        metavar='T', type=int, default=DEFAULT_TIMEOUT,   help='seconds to wait on HTTP requests (default: %d)' % (DEFAULT_TIMEOUT,))
+parser.add_argument('--replay',         metavar='PATH', action='append',    help='re-render archived dumps (plain or gzip) in a directory, file or glob; repeatable')
+parser.add_argument('--render-processes', metavar='N', type=int, default=1, help='processes rendering --replay dumps in parallel (default: 1)')
+parser.add_argument('--output',         metavar='FILE', type=FileType('w'), help='write messages to FILE as json lines instead of posting')
 parser.add_argument('file',             type=FileType('r'), nargs='*',      help='read from file(s) instead of Trello')
 
 ARGS = parser.parse_args()
@@ -32,6 +107,10 @@ def stderr(s):
     sys.stderr.write(s)
     sys.stderr.write('\n')
 
+def row_key(row):
+    """An outbox row's stream and subject, which are posted in order"""
+    return (row[3]['to'], row[1])
+
 
 class Logger(object):
     def _log(self, msg):
@@ -39,8 +118,10 @@ class Logger(object):
             # Defensive replace as this is a verbose/debug print only
             print msg.encode('utf-8', 'backslashreplace')
 
-    def trello_json(self, msg):
-        self._log(msg)
+    def trello_json(self, obj):
+        if ARGS.verbose:
+            # Lazily read actions (e.g. from a backfill) are not expanded
+            self._log(json.dumps(obj, default=lambda o: '<stream>'))
 
     def zulip_msg(self, msg):
         self._log(msg)
@@ -48,6 +129,15 @@ class Logger(object):
     def start_date(self, msg):
         self._log(msg)
 
+    def stats(self, msg):
+        self._log(msg)
+
+    def schedule(self, msg):
+        self._log(msg)
+
+    def backfill(self, msg):
+        self._log(msg)
+
 
 class Config(object):
     def __init__(self):
@@ -57,7 +147,10 @@ class Config(object):
         if ARGS.config:
             secondary = json.loads(ARGS.config.read())
             ARGS.config.close()
-        settings = ['TRELLO_KEY', 'TRELLO_TOKEN', 'TRELLO_ORG', 'ZULIP_EMAIL', 'ZULIP_KEY', 'ZULIP_STREAM']
+        settings = ['TRELLO_KEY', 'TRELLO_TOKEN', 'ZULIP_EMAIL', 'ZULIP_KEY']
+        routes = primary.get('ROUTES', secondary.get('ROUTES', None))
+        if routes is None:
+            settings += ['TRELLO_ORG', 'ZULIP_STREAM']
         for s in settings:
             if s in primary:
                 self.params[s] = primary[s]
@@ -66,6 +159,20 @@ class Config(object):
             else:
                 stderr("Setting not present in config: %s" % (s,))
                 sys.exit(1)
+        # Optional, mostly for pointing at a local stand-in server
+        optional = {'TRELLO_URL' : TRELLO_URL, 'ZULIP_URL' : ZULIP_URL, 'TRELLO_SECRET' : None, 'WEBHOOK_URL' : ''}
+        for s, default in optional.iteritems():
+            self.params[s] = primary.get(s, secondary.get(s, default))
+        if routes is None:
+            self.routes = [Route(self.params['ZULIP_STREAM'], org=self.params['TRELLO_ORG'])]
+        else:
+            try:
+                if isinstance(routes, basestring):
+                    routes = json.loads(routes)
+                self.routes = parse_routes(routes)
+            except ValueError as e:
+                stderr('Bad ROUTES setting: %s' % (e,))
+                sys.exit(1)
     #
     # Config parameters
     #
@@ -73,52 +180,88 @@ class Config(object):
         return self.params['TRELLO_KEY']
     def trello_token(self):
         return self.params['TRELLO_TOKEN']
-    def trello_org(self):
-        return self.params['TRELLO_ORG']
     def zulip_email(self):
         return self.params['ZULIP_EMAIL']
     def zulip_key(self):
         return self.params['ZULIP_KEY']
-    def zulip_stream(self):
-        return self.params['ZULIP_STREAM']
+    def zulip_url(self):
+        return self.params['ZULIP_URL']
+    def trello_secret(self):
+        return self.params['TRELLO_SECRET']
+    def webhook_url(self):
+        return self.params['WEBHOOK_URL']
     #
     # Derived
     #
-    def trello_url(self):
-        return 'https://api.trello.com/1/organization/%s' % (self.trello_org(),)
+    def trello_api(self):
+        return self.params['TRELLO_URL'].rstrip('/')
+    def trello_url(self, org):
+        return '%s/organization/%s' % (self.trello_api(), org)
     def zulip_auth(self):
         return (self.zulip_email(), self.zulip_key())
 
 
 class Loader(object):
-    def __init__(self, logger):
+    """Reads one route's actions and keeps its saved dates"""
+    def __init__(self, logger, transport, route, fetcher=None, metrics=None, directory=None):
         self.logger = logger
+        self.transport = transport
+        self.metrics = metrics or NullMetrics()
+        self.route = route
+        self.fetcher = fetcher
+        self.directory = directory
+        self.label = route.label()
         self.last_date = None
+        self.poll_actions = 0
+        self.checkpoint = Checkpoint(route.path(DATE_FILE), every=ARGS.checkpoint_every,
+                                     interval=ARGS.checkpoint_interval, fsync=ARGS.fsync)
+        self.cursors = BoardCursors(Checkpoint(route.path(BOARDS_FILE), fsync=ARGS.fsync))
+        self.boards = None
+        self.boards_listed_at = 0
+        self.backfill = None
+        self.first_poll = None
+        self.stage = None
+        self.validator = None
+        self.decoded = 0
 
     def _load_date(self):
-        date = datetime.utcnow().isoformat() + 'Z'
-        try:
-            with open(DATE_FILE) as f:
-                date = f.read()
-        except IOError:
-            pass
-        return date
+        return self.checkpoint.load(datetime.utcnow().isoformat() + 'Z')
 
     def _save_date(self, date_str):
         if not ARGS.no_post:
             self.last_date = date_str
-            with open(DATE_FILE, 'w') as f:
-                f.write(date_str)
+            self.checkpoint.advance(date_str)
+
+    def _chunks(self, chunks):
+        if ARGS.pipeline:
+            self.stage = Stage(chunks, ARGS.pipeline_depth)
+            return self.stage
+        return chunks
 
-    def _from_files(self):
+    def from_files(self):
         for f in ARGS.file:
-            text = f.read()
-            if type(text) != unicode:
-                text = text.decode('utf-8')
-            f.close()
-            yield text
+            yield iter_boards(self._chunks(decode_chunks(file_chunks(f))))
+
+    def _counted(self, chunks):
+        for chunk in chunks:
+            self.metrics.inc('trello_bytes_total', len(chunk))
+            yield chunk
+
+    def _response_chunks(self, r):
+        chunks = r.iter_content(CHUNK_SIZE)
+        if self.metrics.enabled:
+            chunks = self._counted(chunks)
+        try:
+            for chunk in decode_chunks(chunks):
+                self.decoded += len(chunk)
+                yield chunk
+        except requests.RequestException as e:
+            # Truncated input surfaces as a parse error to the reader
+            stderr('Error reading Trello response: %s' % (e,))
+        finally:
+            r.close()
 
-    def _from_trello(self):
+    def _poll_org(self):
         post_params = {
             'key' : CONFIG.trello_key(),
             'token' : CONFIG.trello_token(),
@@ -127,96 +270,667 @@ class Loader(object):
             'fields' : 'none',
             'boards' : 'organization',
             'board_fields' : 'name',
-            'board_actions' : 'all',
+            'board_actions' : self.fetcher.action_types,
             'board_actions_limit' : '1000',
-            'board_actions_since' : None # Replaced each iteration
+            'board_actions_since' : self.last_date
         }
+        url = CONFIG.trello_url(self.route.org)
+        conditional = self.fetcher.conditional
+        headers = {}
+        if conditional is not None:
+            # Organization actions are ignored when there are boards anyway
+            post_params['actions'] = 'none'
+            del post_params['actions_limit']
+            post_params.update(action_params('board_actions_'))
+            headers = conditional.headers(url, post_params)
+        started = time()
+        try:
+            r = self.transport.get(url, params=post_params, headers=headers, stream=True)
+        except requests.RequestException as e:
+            raise PollError('Error making Trello request: %s' % (e,))
+        if conditional is not None and conditional.check(url, post_params, r):
+            return []
+        if r.status_code != 200:
+            raise PollError('Error making Trello request: %d %s' % (r.status_code, r.text),
+                            r.status_code, retry_after(r.headers))
+        self.metrics.observe('trello_fetch_seconds', time() - started)
+        if conditional is not None:
+            # Remembered once the poll was processed, see poll_done()
+            self.validator = (url, post_params, r)
+            self.decoded = 0
+        return iter_boards(self._chunks(self._response_chunks(r)))
+
+    def _board_list(self):
+        if (self.boards is None) or (time() - self.boards_listed_at > BOARD_LIST_INTERVAL):
+            if self.route.board is not None:
+                self.boards = [self.fetcher.board(self.route.board)]
+            else:
+                self.boards = self.fetcher.list_boards(self.route.org)
+            self.boards_listed_at = time()
+        return self.boards
+
+    def owns(self, board_id):
+        """Whether actions on board_id belong to this route"""
+        if self.route.board is not None:
+            return board_id == self.route.board
+        try:
+            return any(b['id'] == board_id for b in self._board_list())
+        except PollError as e:
+            stderr('%s%s' % (self.label, e))
+            return False
+
+    def _backfill(self):
+        """First poll for --all: the whole history of every board"""
+        backfill = Backfill(self.fetcher, self.route.path(BACKFILL_DIR), page_size=ARGS.page_size, fsync=ARGS.fsync)
+        if backfill.load():
+            # Only the backfill's own date says what it posted; the date
+            # file may be left from polling before this --all
+            self.last_date = self.checkpoint.start(backfill.posted or self.last_date)
+            self.logger.backfill('%sResuming backfill, posted up to %s' % (self.label, self.last_date))
+        backfill.fetch(self._board_list())
+        self.logger.backfill('%sBackfill spooled %d pages from %d boards' % (
+            self.label,
+            sum(b['pages'] for b in backfill.boards.itervalues()),
+            len(backfill.boards)
+        ))
+        self.backfill = backfill
+        return backfill.replay(skip_before=self.last_date)
+
+    def _poll_boards(self):
+        since_for = lambda b: self.cursors.get(b['id'], self.last_date)
+        boards = []
+        error = None
+        for board, actions, e in self.fetcher.fetch_all(self._board_list(), since_for):
+            if e is not None:
+                stderr('%s%s (board %s)' % (self.label, e, board['id']))
+                error = e
+                continue
+            if actions:
+                # Newest first
+                self.cursors.advance(board['id'], max(actions[0]['date'], actions[-1]['date']))
+            boards.append({'id' : board['id'], 'name' : board['name'], 'actions' : actions})
+        if error is not None and not boards:
+            raise error
+        return boards
+
+    def start(self):
         if ARGS.all:
-            self.last_date = '1970-01-01T00:00:00Z'
-            self.logger.start_date('Loading all available actions')
+            self.last_date = self.checkpoint.start('1970-01-01T00:00:00Z')
+            self.logger.start_date('%sLoading all available actions' % (self.label,))
         else:
             self.last_date = self._load_date()
-            self.logger.start_date('Loading actions since %s' % (self.last_date,))
-        first = True
-        while first or (not ARGS.once):
-            if not first:
-                try:
-                    sleep(ARGS.sleep)
-                except KeyboardInterrupt:
-                    # Silence stack trace
-                    print ''
-                    sys.exit(0)
-            else:
-                first = False
-            if self.last_date is not None:
-                post_params['board_actions_since'] = self.last_date
-            r = requests.get(CONFIG.trello_url(), params=post_params)
-            if r.status_code == 200:
-                text = r.text
-                if type(text) != unicode:
-                    text = r.text.decode('utf-8')
-                yield text
-            else:
-                stderr('Error making Trello request: %d %s' % (r.status_code, r.text))
-
-    def load_func(self):
-        if ARGS.file:
-            func = self._from_files
+            self.logger.start_date('%sLoading actions since %s' % (self.label, self.last_date))
+        if ARGS.per_board or self.route.board is not None:
+            if not ARGS.all:
+                self.cursors.load()
+            self._poll = self._poll_boards
         else:
-            func = self._from_trello
-        for i in func():
-            yield i
+            self._poll = self._poll_org
+        self.first_poll = ARGS.all and self._backfill
+
+    def _warm(self):
+        """Fetch this route's names into the directory, best effort"""
+        source = '%s/%s' % (self.route.org, self.route.board)
+        if not self.directory.due(source):
+            return
+        try:
+            self.directory.warm(source, self.fetcher.names(self.route.org, self.route.board))
+        except PollError as e:
+            stderr('%sError warming the directory: %s' % (self.label, e))
 
-    def saw_action(self, action):
+    def poll(self):
+        """Board dicts for one poll; raises PollError"""
+        if self.directory is not None:
+            self._warm()
+        if self.first_poll:
+            boards = self.first_poll()
+            self.first_poll = None
+            return boards
+        return self._poll()
+
+    def saw_action(self, date):
         if not ARGS.file:
-            self.last_date = action.date()
-            self._save_date(self.last_date)
+            self.poll_actions += 1
+            # Boards are not date ordered against each other with --stream
+            if self.last_date is None or date > self.last_date:
+                self.last_date = date
+                self._save_date(self.last_date)
+
+    def rewind(self):
+        """Forget dates seen since the last saved checkpoint"""
+        self.validator = None
+        self.cursors.rewind()
+        self.checkpoint.rewind()
+        if self.checkpoint.value is not None:
+            self.last_date = self.checkpoint.value
+
+    def checkpoint_due(self):
+        return self.checkpoint.due()
+
+    def save_checkpoint(self):
+        self.checkpoint.flush()
+        if self.backfill is not None and self.checkpoint.saved is not None:
+            self.backfill.mark_posted(self.checkpoint.saved)
+
+    def poll_done(self):
+        """Everything from the last poll is in the outbox"""
+        if self.backfill is not None:
+            for board_id, date in self.backfill.newest().iteritems():
+                self.cursors.advance(board_id, date)
+            self.backfill.finish()
+            self.backfill = None
+        self.cursors.commit(save=not ARGS.no_post)
+        self.checkpoint.flush()
+        if self.validator is not None:
+            url, params, r = self.validator
+            conditional = self.fetcher.conditional
+            conditional.remember(url, params, r, conditional.count(r, self.decoded))
+            self.validator = None
 
 
 class Runner(object):
     def __init__(self, logger):
         self.logger = logger
+        self.transport = Transport(pool_size=ARGS.pool_size, timeout=ARGS.timeout)
+        self.transport.limiter(CONFIG.zulip_url(), ARGS.zulip_rate)
+        self.transport.limiter(CONFIG.trello_api(), ARGS.trello_rate)
+        # Each lane holds the whole --shed-backlog, so the backlog can reach
+        # it even when every message goes to one subject
+        self.delivery = Delivery(self._send, workers=ARGS.post_concurrency,
+                                 queue_size=max(DEFAULT_QUEUE_SIZE, ARGS.shed_backlog))
+        self.digest = Digest(self._submit, window=ARGS.digest_window,
+                             max_chars=ZULIP_MESSAGE_MAX, max_count=ARGS.digest_max)
+        self.seen = SeenIndex(SEEN_FILE, days=ARGS.seen_days)
+        if not (ARGS.file or ARGS.replay):
+            self.seen.load()
+        self.metrics = NullMetrics()
+        if ARGS.metrics or ARGS.verbose:
+            self.metrics = Metrics()
+        if ARGS.metrics:
+            MetricsServer((ARGS.metrics_host, ARGS.metrics), self.metrics).start()
+        self.processing = 0.0
+        try:
+            self.priorities = Priorities(parse_priorities(ARGS.priority))
+        except ValueError as e:
+            stderr('Bad --priority: %s' % (e,))
+            sys.exit(1)
+        # Action key -> priority class, until _submit() posts it
+        self.priority_of = {}
+        # Stream -> action type -> messages skipped since the last summary
+        self.shed = {}
+        self.shed_total = 0
+        self.directory = None
+        if ARGS.directory:
+            self.directory = Directory(DIRECTORY_FILE, ttl=ARGS.directory_ttl).load()
+        self.filter = ActionFilter()
+        if ARGS.filter_types or ARGS.deny_types:
+            self.filter = ActionFilter.rendered(allow=parse_types(ARGS.allow_types),
+                                                deny=parse_types(ARGS.deny_types),
+                                                directory=ARGS.directory)
+        self.outbox = None
+        # (stream, subject) -> rows that failed to post, and every later
+        # row for that subject, in order. Only the subject's own lane adds
+        # to or posts them, so retries never overtake each other.
+        self.held = {}
+        self._held_lock = threading.Lock()
+        # Set by a post that fails with Zulip down, so other subjects'
+        # posts are held too; cleared by the next post that goes through
+        self.outage = False
+        self.retry_delay = RETRY_MIN_DELAY
+        self.retry_at = None
+        if not (ARGS.no_post or ARGS.output):
+            self.outbox = Outbox(OUTBOX_FILE, fsync=ARGS.fsync).open()
+            self._resend()
+        # One fetcher and poll pool for every route, sharing the transport
+        self.fetcher = BoardFetcher(self.transport, CONFIG.trello_api(), CONFIG.trello_key(),
+                                    CONFIG.trello_token(), workers=ARGS.fetch_concurrency,
+                                    metrics=self.metrics, lean=ARGS.lean,
+                                    action_types=self.filter.param())
+        self.pool = ThreadPool(max(ARGS.fetch_concurrency, 1))
+        self.loaders = [Loader(logger, self.transport, route, self.fetcher, self.metrics, self.directory)
+                        for route in CONFIG.routes]
 
-    def run(self):
-        printer = ActionPrinter()
-        loader = Loader(self.logger)
-        for json_text in loader.load_func():
-            self.logger.trello_json(json_text)
-            json_dict = json.loads(json_text)
-            actions = []
-            if 'boards' in json_dict:
-                boards = json_dict['boards']
-                for b in boards:
-                    actions += b['actions']
-            elif 'actions' in json_dict:
-                actions += json_dict['actions']
+    def _resend(self):
+        """Queue what an earlier run left in the outbox"""
+        for row in self.outbox.pending():
+            # A row without actions (e.g. the skipped updates summary) is
+            # only done once posted
+            if row[2] and all(action_id in self.seen for action_id, date in row[2]):
+                # Posted, but stopped before it was removed
+                self.outbox.done(row)
+            else:
+                self._deliver(row)
+
+    def _deliver(self, row, priority=NORMAL):
+        # Per stream and subject order
+        self.delivery.submit(row_key(row), row, priority)
+
+    def _submit(self, key, actions, content):
+        stream, subject = key
+        post_params = {
+            'type' : 'stream',
+            'to' : stream,
+            'subject' : subject,
+            'content' : content
+        }
+        # A digest is as important as the most important message in it
+        priority = min([self.priority_of.pop(action_id, NORMAL) for action_id, date in actions] or [NORMAL])
+        if ARGS.output:
+            post_params['actions'] = actions
+            ARGS.output.write(json.dumps(post_params) + '\n')
+            return
+        self._deliver(self.outbox.put(subject, actions, post_params), priority)
+
+    def _shedding(self, priority):
+        return (priority == LOW and ARGS.shed_backlog > 0
+                and self.delivery.backlog() >= ARGS.shed_backlog)
+
+    def _summarize_shed(self):
+        """One message per stream counting what was skipped"""
+        for stream, types in sorted(self.shed.iteritems()):
+            counts = sorted(types.iteritems(), key=lambda t: (-t[1], t[0]))
+            content = u'Skipped %d low priority updates while posts were backed up: %s' % (
+                sum(types.itervalues()),
+                u', '.join(u'%d %s' % (n, t) for t, n in counts)
+            )
+            self.logger.zulip_msg(content)
+            self._submit((stream, SHED_SUBJECT), [], content)
+        self.shed = {}
+
+    def _queued(self, action_id):
+        if action_id in self.seen:
+            return True
+        return self.outbox is not None and action_id in self.outbox
+
+    def _drain(self):
+        """Make everything rendered so far durable in the outbox"""
+        self.digest.flush()
+        if self.outbox is not None:
+            self.outbox.commit()
+        if ARGS.output:
+            ARGS.output.flush()
+        self.seen.flush()
+        if self.directory is not None:
+            self.directory.save()
+
+    def _finish(self):
+        """Post everything rendered so far"""
+        self._drain()
+        self.delivery.join()
+        self._drain()
+        if self.directory is not None:
+            self.directory.save(force=True)
+
+    def _send(self, item):
+        if item[0] == RETRY:
+            self._retry_key(item[1])
+        else:
+            self._post(item)
+
+    def _hold(self, row):
+        """Whether row waits behind a held post for its subject (or an
+        outage), in which case it is added to the held ones"""
+        key = row_key(row)
+        with self._held_lock:
+            held = self.held.get(key, None)
+            if held is None and self.outage:
+                held = self.held[key] = []
+            if held is None:
+                return False
+            held.append(row)
+            return True
+
+    def _post(self, row):
+        if self._hold(row):
+            return
+        if not self._try_post(row):
+            with self._held_lock:
+                self.held.setdefault(row_key(row), []).append(row)
+
+    def _retry_key(self, key):
+        """Post the rows held for key, oldest first, until one fails again"""
+        while True:
+            with self._held_lock:
+                held = self.held.get(key, None)
+                if not held:
+                    self.held.pop(key, None)
+                    return
+                row = held[0]
+            if not self._try_post(row):
+                return
+            with self._held_lock:
+                held.pop(0)
+
+    def _retry_held(self):
+        """Ask each held subject's lane to try its posts again"""
+        with self._held_lock:
+            keys = list(self.held)
+        for key in keys:
+            self.delivery.submit(key, (RETRY, key))
+
+    def _retry_due(self):
+        """_retry_held() with a growing delay, for when no polls do it"""
+        if not self.held:
+            self.retry_delay = RETRY_MIN_DELAY
+            self.retry_at = None
+            return
+        now = time()
+        if self.retry_at is None:
+            self.retry_at = now + self.retry_delay
+        elif now >= self.retry_at:
+            self._retry_held()
+            self.retry_delay = min(self.retry_delay * 2, RETRY_MAX_DELAY)
+            self.retry_at = now + self.retry_delay
+
+    def _try_post(self, row):
+        """False if row should be held and tried again later"""
+        row_id, subject, actions, post_params = row
+        started = time()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                r = self.transport.post(CONFIG.zulip_url(), auth=CONFIG.zulip_auth(), data=post_params)
+            except requests.RequestException as e:
+                r = None
+                error = 'Error POSTing to Zulip: %s' % (e,)
+                self.metrics.inc('zulip_failures_total', status='connection')
+            else:
+                if r.status_code == 200:
+                    break
+                error = 'Error %d POSTing to Zulip: %s' % (r.status_code, r.text)
+                self.metrics.inc('zulip_failures_total', status=r.status_code)
+                if not is_retryable(r.status_code):
+                    stderr(error)
+                    self.outbox.done(row)
+                    return True
+            if r is None or r.status_code != 429:
+                # Zulip is down: stays in the outbox, and this and the posts
+                # after it are tried again later
+                stderr('%s (trying again later)' % (error,))
+                self.outage = True
+                return False
+            if attempt >= POST_ATTEMPTS:
+                stderr('%s (giving up for now after %d attempts)' % (error, attempt))
+                return False
+            # 429s already paused the rate limiter for the Retry-After time
+        self.outage = False
+        if not (ARGS.file or ARGS.replay):
+            for action_id, date in actions:
+                self.seen.add(action_id, date)
+        self.outbox.done(row)
+        if self.metrics.enabled:
+            now = time()
+            self.metrics.observe('zulip_post_seconds', now - started)
+            self.metrics.inc('zulip_posts_total')
+            for action_id, date in actions:
+                self.metrics.observe('lag_seconds', now - parse_date(date))
+        return True
+
+    def _process(self, loader, printer, actions, pushed=False):
+        """Pushed actions only go to the seen index; the saved date is
+        left to the polls so they can fill any gaps"""
+        route = loader.route
+        timed = self.metrics.enabled
+        if timed:
+            started = time()
+        for a in actions:
+            if not pushed:
+                if (not ARGS.stream) and loader.checkpoint_due():
+                    # Only persist the date once everything up to it is in the outbox
+                    self._drain()
+                    loader.save_checkpoint()
+                loader.saw_action(a['date'])
+            if self.directory is not None:
+                self.directory.learn(a)
+            if not self.filter.wanted(a):
+                continue
+            action = Action(a)
+            key = route.key(action.id())
+            if self._queued(key):
+                continue
+            if timed:
+                rendering = time()
+                msg = printer.get_message(action)
+                self.metrics.observe('render_seconds', time() - rendering, type=action.type())
             else:
-                stderr('Unknown input format')
-                sys.exit(1)
-            actions.sort(lambda x,y: cmp(x['date'], y['date']))
-            for a in actions:
-                action = Action(a)
-                loader.saw_action(action)
                 msg = printer.get_message(action)
-                if msg is None:
+            if msg is None:
+                continue
+            priority = self.priorities.of(action)
+            if self._shedding(priority):
+                types = self.shed.setdefault(route.stream, {})
+                types[action.type()] = types.get(action.type(), 0) + 1
+                self.shed_total += 1
+                self.metrics.inc('messages_shed_total', type=action.type())
+                continue
+            self.logger.zulip_msg(msg.replace('\n', '\t'))
+            if not ARGS.no_post:
+                self.priority_of[key] = priority
+                self.digest.add((route.stream, action.derive_subject()), action.date(), key, msg)
+        if timed:
+            self.processing += time() - started
+
+    def _run_poll(self, loader, printer, payload):
+        self._retry_held()
+        self._drain()
+        boards = []
+        started = time()
+        self.processing = 0.0
+        try:
+            for board in payload:
+                self.logger.trello_json(board)
+                actions = ordered(board.get('actions', []))
+                if ARGS.stream:
+                    self._process(loader, printer, actions)
+                else:
+                    boards.append(actions)
+        except FormatError as e:
+            stderr(str(e))
+            sys.exit(1)
+        except ValueError as e:
+            stderr('Error reading input: %s' % (e,))
+            self._drain()
+            loader.rewind()
+            return
+        # Time not spent in _process (--stream) went to reading and parsing
+        self.metrics.observe('parse_seconds', time() - started - self.processing)
+        self._process(loader, printer, merge_actions(boards))
+        if self.shed:
+            self._summarize_shed()
+        self._drain()
+        loader.poll_done()
+        self.logger.stats(self.transport.stats_line())
+        self.logger.stats(self.digest.stats_line())
+        self.logger.stats('priority: %d high, %d normal, %d low posted, %d shed' % (
+            self.delivery.sent[0],
+            self.delivery.sent[1],
+            self.delivery.sent[2],
+            self.shed_total
+        ))
+        self.logger.stats('filter: %d actions dropped before rendering' % (self.filter.dropped,))
+        if loader.stage is not None:
+            self.logger.stats('pipeline: reader waited %d times, renderer waited %d times' % (
+                loader.stage.full,
+                loader.stage.empty
+            ))
+        if self.outbox is not None:
+            self.logger.stats(self.outbox.stats_line())
+        if self.fetcher.conditional is not None:
+            self.logger.stats(self.fetcher.conditional.stats_line())
+        if self.directory is not None:
+            self.logger.stats(self.directory.stats_line())
+        self.logger.stats(self.metrics.stats_line())
+        sys.stdout.flush()
+
+    def _poll_all(self):
+        """(loader, result) for every route, with up to --fetch-concurrency
+        polls started ahead of the one being read"""
+        started = deque()
+        for loader in self.loaders:
+            started.append((loader, self.pool.apply_async(loader.poll)))
+            if len(started) >= ARGS.fetch_concurrency:
+                yield started.popleft()
+        while started:
+            yield started.popleft()
+
+    def _load(self, scheduler):
+        """(loader, payload) for each poll of each route. One scheduler
+        paces all routes, backing off only when every route failed."""
+        if ARGS.file:
+            loader = self.loaders[0]
+            for payload in loader.from_files():
+                yield loader, payload
+            return
+        for loader in self.loaders:
+            loader.start()
+        delay = None
+        while (delay is None) or (not ARGS.once):
+            if delay is not None:
+                self.logger.schedule('Sleeping %.1fs (%s)' % (delay, scheduler.reason))
+                try:
+                    sleep(delay)
+                except KeyboardInterrupt:
+                    # Silence stack trace
+                    print ''
+                    sys.exit(0)
+            actions = 0
+            errors = []
+            for loader, result in self._poll_all():
+                try:
+                    payload = result.get()
+                except PollError as e:
+                    stderr('%s%s' % (loader.label, e))
+                    self.metrics.inc('trello_errors_total')
+                    errors.append(e)
                     continue
-                self.logger.zulip_msg(msg.replace('\n', '\t'))
-                post_params = {
-                    'type' : 'stream',
-                    'to' : CONFIG.zulip_stream(),
-                    'subject' : action.derive_subject(),
-                    'content' : msg
-                }
-                if not ARGS.no_post:
-                    r = requests.post(ZULIP_URL, auth=CONFIG.zulip_auth(), data=post_params)
-                    if r.status_code != 200:
-                        stderr('Error %d POSTing to Zulip: %s' % (r.status_code, r.text))
-            sys.stdout.flush()
+                loader.poll_actions = 0
+                yield loader, payload
+                self.metrics.observe('poll_actions', loader.poll_actions)
+                actions += loader.poll_actions
+            if len(errors) == len(self.loaders):
+                delay = scheduler.failure(errors[0].status_code, errors[0].retry_after)
+            else:
+                delay = scheduler.success(actions)
+
+    def run(self):
+        printer = ActionPrinter(self.directory)
+        scheduler = Scheduler(ARGS.sleep, ARGS.min_sleep, ARGS.max_sleep)
+        for loader, payload in self._load(scheduler):
+            self._run_poll(loader, printer, payload)
+        self._finish()
+
+    def run_replay(self):
+        """Render archived dumps again, oldest first per dump, without
+        touching the saved dates or the seen index"""
+        route = self.loaders[0].route
+        paths = dump_paths(ARGS.replay)
+        started = time()
+        actions = 0
+        messages = 0
+        # Time spent handing messages over, which waits on posting
+        queueing = 0.0
+        try:
+            for path, count, rendered in render_dumps(paths, ARGS.render_processes):
+                self.logger.backfill('Replaying %s: %d actions, %d messages' % (path, count, len(rendered)))
+                actions += count
+                messages += len(rendered)
+                queued_from = time()
+                for subject, date, action_id, msg in rendered:
+                    self.logger.zulip_msg(msg.replace('\n', '\t'))
+                    if not ARGS.no_post:
+                        self.digest.add((route.stream, subject), date, route.key(action_id), msg)
+                queueing += time() - queued_from
+        except ValueError as e:
+            stderr('Error reading input: %s' % (e,))
+            sys.exit(1)
+        rendering = time() - started - queueing
+        self._finish()
+        elapsed = time() - started
+        print 'Replayed %d actions from %d dumps into %d messages in %.1fs: %.0f actions/s rendering, %.0f messages/s overall' % (
+            actions,
+            len(paths),
+            messages,
+            elapsed,
+            actions / max(rendering, 0.001),
+            messages / max(elapsed, 0.001)
+        )
+
+    def _reconcile(self, incoming):
+        for loader, payload in self._load(Scheduler(ARGS.reconcile)):
+            done = threading.Event()
+            incoming.put((loader, payload, done))
+            done.wait()
+
+    def _loader_for(self, action):
+        if len(self.loaders) == 1:
+            return self.loaders[0]
+        board_id = action.get('data', {}).get('board', {}).get('id', None)
+        for loader in self.loaders:
+            if loader.owns(board_id):
+                return loader
+        return None
+
+    def run_webhook(self):
+        """Post actions as Trello pushes them, polling now and then as a
+        safety net. Everything is processed on this thread, in arrival order."""
+        if not CONFIG.trello_secret() and not ARGS.insecure_webhook:
+            # Anyone who can reach the port could post as any Trello member
+            stderr('--webhook needs TRELLO_SECRET to verify callbacks (or --insecure-webhook)')
+            sys.exit(1)
+        if CONFIG.trello_secret() and not CONFIG.webhook_url():
+            # Trello signs the body and the callback URL, so without it every
+            # callback would fail verification
+            stderr('--webhook needs WEBHOOK_URL, the callback URL, to verify callbacks with TRELLO_SECRET')
+            sys.exit(1)
+        printer = ActionPrinter(self.directory)
+        incoming = Queue()
+        server = WebhookServer((ARGS.webhook_host, ARGS.webhook), incoming.put,
+                               secret=CONFIG.trello_secret(), callback_url=CONFIG.webhook_url())
+        server.start()
+        self.logger.start_date('Listening for webhooks on port %d' % (ARGS.webhook,))
+        if ARGS.reconcile > 0:
+            t = threading.Thread(target=self._reconcile, args=(incoming,))
+            t.daemon = True
+            t.start()
+        while True:
+            try:
+                # A timeout keeps the wait interruptible, and held posts
+                # are retried without waiting for a poll
+                item = incoming.get(True, RETRY_MIN_DELAY)
+            except KeyboardInterrupt:
+                print ''
+                sys.exit(0)
+            except Empty:
+                self._retry_due()
+                continue
+            if type(item) == tuple:
+                loader, payload, done = item
+                self._run_poll(loader, printer, payload)
+                done.set()
+                continue
+            self.logger.trello_json(item)
+            loader = self._loader_for(item)
+            if loader is None:
+                stderr('No route for pushed action %s' % (item.get('id', None),))
+            else:
+                self._process(loader, printer, [item], pushed=True)
+            if incoming.empty():
+                # Pushed actions are shed too, and may never see a poll
+                if self.shed:
+                    self._summarize_shed()
+                self._drain()
+                self._retry_due()
+                sys.stdout.flush()
 
 
 if __name__ == '__main__':
     CONFIG = Config()
     logger = Logger()
     runner = Runner(logger)
-    runner.run()
-
+    if ARGS.replay:
+        runner.run_replay()
+    elif ARGS.webhook:
+        runner.run_webhook()
+    else:
+        runner.run()
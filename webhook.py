@@ -0,0 +1,100 @@
+"""HTTP receiver for Trello webhook callbacks"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import base64
+import hashlib
+import hmac
+import json
+import threading
+
+
+MAX_BODY            = 1024 * 1024
+
+
+def signature(secret, body, callback_url):
+    """Trello's X-Trello-Webhook value for a callback body"""
+    digest = hmac.new(secret.encode('utf-8'), body + callback_url.encode('utf-8'), hashlib.sha1).digest()
+    return base64.b64encode(digest)
+
+
+def extract_action(payload):
+    """Trello wraps the action as {'action': ..., 'model': ...}; a bare
+    action object (e.g. from test/actions) is accepted as-is"""
+    if type(payload) != dict:
+        return None
+    if 'action' in payload:
+        return payload['action']
+    if 'type' in payload and 'date' in payload:
+        return payload
+    return None
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def _reply(self, code, body=''):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        # Trello checks the callback URL responds before creating a webhook
+        self._reply(200)
+
+    def do_GET(self):
+        self._reply(200, 'ok')
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._reply(400, 'bad content length')
+            return
+        if length > MAX_BODY:
+            self._reply(413, 'too large')
+            return
+        body = self.rfile.read(length)
+        server = self.server
+        if server.secret:
+            expected = signature(server.secret, body, server.callback_url)
+            if not hmac.compare_digest(expected, self.headers.get('X-Trello-Webhook', '')):
+                self._reply(401, 'bad signature')
+                return
+        try:
+            action = extract_action(json.loads(body.decode('utf-8')))
+        except ValueError:
+            action = None
+        if action is None:
+            self._reply(400, 'no action')
+            return
+        server.handle_action(action)
+        self._reply(200, 'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookServer(ThreadingMixIn, HTTPServer):
+    """Calls handle_action(action_dict) for every accepted callback.
+
+    When `secret` is set, callbacks must carry a valid X-Trello-Webhook
+    signature computed over the body and `callback_url`.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handle_action, secret=None, callback_url=''):
+        HTTPServer.__init__(self, address, WebhookHandler)
+        self.handle_action = handle_action
+        self.secret = secret
+        self.callback_url = callback_url or ''
+
+    def start(self):
+        t = threading.Thread(target=self.serve_forever)
+        t.daemon = True
+        t.start()
+        return t